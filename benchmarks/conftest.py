@@ -0,0 +1,42 @@
+"""Shared fixtures for the benchmark suite.
+
+The dataset size is set with ``WOD_BENCH_EVENTS`` and ``WOD_BENCH_USERS``;
+the same seed always produces the same events, so numbers from different
+runs and branches are comparable.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'my_app'))
+
+import mock_subgraph  # noqa: E402
+import synthetic  # noqa: E402
+
+BENCH_EVENTS = int(os.getenv('WOD_BENCH_EVENTS', '1000000'))
+BENCH_USERS = int(os.getenv('WOD_BENCH_USERS', '20000'))
+BENCH_SEED = int(os.getenv('WOD_BENCH_SEED', '0'))
+
+
+@pytest.fixture(scope='session')
+def events():
+    return synthetic.generate_events(BENCH_EVENTS, BENCH_USERS, seed=BENCH_SEED)
+
+
+@pytest.fixture(scope='session')
+def store_path(events, tmp_path_factory):
+    return synthetic.write_store(events, str(tmp_path_factory.mktemp('store') / 'wod.sqlite'))
+
+
+@pytest.fixture(scope='session')
+def subgraph(events):
+    return mock_subgraph.MockSubgraph(events)
+
+
+@pytest.fixture(scope='session')
+def subgraph_url(subgraph):
+    server = mock_subgraph.serve(subgraph)
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,337 @@
+"""A local stand-in for the DailyTreasureEvent subgraph.
+
+Serves the entities of ``daily_treasure_event/schema.graphql`` from a frame
+of synthetic events and answers the subset of graph-node's GraphQL API the
+app uses: aliased root fields, ``first``/``skip``/``orderBy``/
+``orderDirection``/``where`` on collections (with ``_gt``, ``_gte``, ``_lt``,
+``_lte``, ``_in``, ``_not`` and ``_not_in`` filters), single-entity lookups
+by ``id``, nested ``user { ... }`` selections and variables. graph-node's
+limits of 1000 rows per page and a ``skip`` of at most 5000 are enforced.
+
+:class:`MockSubgraph` can be passed directly as a ``client`` to
+:mod:`wod.pagination`, or served over HTTP::
+
+    python benchmarks/mock_subgraph.py --events 1000000 --port 8000
+    SUBGRAPH_URL=http://localhost:8000 streamlit run app.py
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'my_app'))
+import synthetic  # noqa: E402
+
+MAX_FIRST = 1000
+MAX_SKIP = 5000
+DEFAULT_FIRST = 100
+
+# Root field names per entity, and how each field is typed
+ENTITIES = {
+    'ChestOpened': ('chestOpened', 'chestOpeneds'),
+    'User': ('user', 'users'),
+    'DailyChestOpen': ('dailyChestOpen', 'dailyChestOpens'),
+    'UserDailyChestOpen': ('userDailyChestOpen', 'userDailyChestOpens'),
+    'HourlyChestOpen': ('hourlyChestOpen', 'hourlyChestOpens'),
+    'UserHourlyChestOpen': ('userHourlyChestOpen', 'userHourlyChestOpens'),
+}
+BIGINT_FIELDS = {'timestamp', 'blockNumber', 'logIndex', 'hourStartTimestamp'}
+RELATION_FIELDS = {'user': 'User'}
+FILTER_SUFFIXES = ('_not_in', '_in', '_not', '_gte', '_gt', '_lte', '_lt')
+
+
+class GraphQLError(Exception):
+    pass
+
+
+TOKEN = re.compile(r'''
+    (?P<skip>[\s,]+|\#[^\n]*)
+  | (?P<string>"(?:\\.|[^"\\])*")
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<name>[_A-Za-z][_0-9A-Za-z]*)
+  | (?P<punct>\.\.\.|[{}()\[\]:!$=@|&])
+''', re.VERBOSE)
+
+
+def _tokenize(source):
+    tokens, position = [], 0
+    while position < len(source):
+        match = TOKEN.match(source, position)
+        if not match:
+            raise GraphQLError(f"Syntax Error: unexpected character {source[position]!r}")
+        position = match.end()
+        if match.lastgroup != 'skip':
+            tokens.append((match.lastgroup, match.group()))
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser for a single query operation."""
+
+    def __init__(self, source, variables):
+        self.tokens = _tokenize(source)
+        self.position = 0
+        self.variables = variables or {}
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        token = self.peek()
+        if token[0] is None or (value is not None and token[1] != value):
+            raise GraphQLError(f"Syntax Error: expected {value or 'a token'}, found {token[1]}")
+        self.position += 1
+        return token[1]
+
+    def document(self):
+        if self.peek()[1] in ('query', 'subscription', 'mutation'):
+            self.take()
+            if self.peek()[0] == 'name':
+                self.take()
+            if self.peek()[1] == '(':
+                # Variable definitions: only the values passed in are used
+                depth = 0
+                while True:
+                    value = self.take()
+                    depth += {'(': 1, ')': -1}.get(value, 0)
+                    if depth == 0:
+                        break
+        return self.selection_set()
+
+    def selection_set(self):
+        self.take('{')
+        selections = []
+        while self.peek()[1] != '}':
+            name = self.take()
+            alias = name
+            if self.peek()[1] == ':':
+                self.take(':')
+                name = self.take()
+            arguments = self.arguments() if self.peek()[1] == '(' else {}
+            children = self.selection_set() if self.peek()[1] == '{' else None
+            selections.append((alias, name, arguments, children))
+        self.take('}')
+        return selections
+
+    def arguments(self):
+        self.take('(')
+        arguments = {}
+        while self.peek()[1] != ')':
+            name = self.take()
+            self.take(':')
+            arguments[name] = self.value()
+        self.take(')')
+        return arguments
+
+    def value(self):
+        kind, text = self.peek()
+        if text == '$':
+            self.take('$')
+            return self.variables.get(self.take())
+        if text == '[':
+            self.take('[')
+            items = []
+            while self.peek()[1] != ']':
+                items.append(self.value())
+            self.take(']')
+            return items
+        if text == '{':
+            self.take('{')
+            fields = {}
+            while self.peek()[1] != '}':
+                name = self.take()
+                self.take(':')
+                fields[name] = self.value()
+            self.take('}')
+            return fields
+        self.take()
+        if kind == 'string':
+            return json.loads(text)
+        if kind == 'number':
+            return float(text) if re.search(r'[.eE]', text) else int(text)
+        return {'true': True, 'false': False, 'null': None}.get(text, text)
+
+
+class _Table:
+    """Columnar entity rows with cached sort orders."""
+
+    def __init__(self, frame):
+        self.columns = {name: frame[name].to_numpy() for name in frame.columns}
+        self.columns['id'] = self.columns['id'].astype(str)
+        self.index = {key: i for i, key in enumerate(self.columns['id'].tolist())}
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def order(self, field):
+        with self._lock:
+            if field not in self._orders:
+                self._orders[field] = np.lexsort((self.columns['id'], self.columns[field]))
+            return self._orders[field]
+
+
+def _coerce(field, value):
+    if isinstance(value, list):
+        return [_coerce(field, item) for item in value]
+    if field in BIGINT_FIELDS or isinstance(value, bool):
+        return value if isinstance(value, bool) else int(value)
+    return value
+
+
+class MockSubgraph:
+    def __init__(self, events):
+        """Serve ``events`` (a frame from :func:`synthetic.generate_events`) and the entities derived from it."""
+        self.events = events
+        self._builders = {
+            'ChestOpened': lambda: events.drop(columns=['isBot'], errors='ignore'),
+            'User': lambda: synthetic.users_table(events),
+            'DailyChestOpen': lambda: synthetic.daily_table(events),
+            'UserDailyChestOpen': lambda: synthetic.user_daily_table(events),
+            'HourlyChestOpen': lambda: synthetic.hourly_table(events),
+            'UserHourlyChestOpen': lambda: synthetic.hourly_table(events, per_user=True),
+        }
+        self._tables = {}
+        self._lock = threading.Lock()
+        self.roots = {}
+        for entity, (single, plural) in ENTITIES.items():
+            self.roots[single] = (entity, False)
+            self.roots[plural] = (entity, True)
+
+    def table(self, entity):
+        # Entities are only derived from the events once they are queried
+        with self._lock:
+            if entity not in self._tables:
+                self._tables[entity] = _Table(self._builders[entity]())
+            return self._tables[entity]
+
+    def _mask(self, table, where):
+        mask = np.ones(len(table), dtype=bool)
+        for key, value in (where or {}).items():
+            field, op = key, ''
+            for suffix in FILTER_SUFFIXES:
+                if key.endswith(suffix) and key[:-len(suffix)] in table.columns:
+                    field, op = key[:-len(suffix)], suffix
+                    break
+            if field not in table.columns:
+                raise GraphQLError(f"Type `{key}` is not a valid filter")
+            column, value = table.columns[field], _coerce(field, value)
+            if op == '':
+                mask &= column == value
+            elif op == '_not':
+                mask &= column != value
+            elif op == '_in':
+                mask &= np.isin(column, value)
+            elif op == '_not_in':
+                mask &= ~np.isin(column, value)
+            elif op == '_gt':
+                mask &= column > value
+            elif op == '_gte':
+                mask &= column >= value
+            elif op == '_lt':
+                mask &= column < value
+            elif op == '_lte':
+                mask &= column <= value
+        return mask
+
+    def _render(self, entity, table, rows, selections):
+        rendered = [{} for _ in rows]
+        for alias, name, _, children in selections:
+            if name == '__typename':
+                values = [entity] * len(rows)
+            elif name not in table.columns:
+                raise GraphQLError(f"Type `{entity}` has no field `{name}`")
+            elif name in RELATION_FIELDS:
+                related = self.table(RELATION_FIELDS[name])
+                keys = table.columns[name][rows].tolist()
+                positions = [related.index[key] for key in keys]
+                if children:
+                    values = self._render(RELATION_FIELDS[name], related, positions, children)
+                else:
+                    values = keys
+            else:
+                values = table.columns[name][rows].tolist()
+                if name in BIGINT_FIELDS:
+                    values = [str(value) for value in values]
+            for row, value in zip(rendered, values):
+                row[alias] = value
+        return rendered
+
+    def _resolve(self, name, arguments, children):
+        if name not in self.roots:
+            raise GraphQLError(f"Type `Query` has no field `{name}`")
+        entity, plural = self.roots[name]
+        table = self.table(entity)
+        if not plural:
+            position = table.index.get(arguments.get('id'))
+            return None if position is None else self._render(entity, table, [position], children)[0]
+
+        first = arguments.get('first', DEFAULT_FIRST)
+        skip = arguments.get('skip', 0)
+        if not 0 <= first <= MAX_FIRST:
+            raise GraphQLError(f"The `first` argument must be between 0 and {MAX_FIRST}, but is {first}")
+        if not 0 <= skip <= MAX_SKIP:
+            raise GraphQLError(f"The `skip` argument must be between 0 and {MAX_SKIP}, but is {skip}")
+        order = table.order(arguments.get('orderBy') or 'id')
+        if arguments.get('orderDirection') == 'desc':
+            order = order[::-1]
+        order = order[self._mask(table, arguments.get('where'))[order]]
+        return self._render(entity, table, order[skip:skip + first].tolist(), children)
+
+    def execute(self, query, variables=None):
+        """Answer a query the way the subgraph's HTTP endpoint would, as a decoded JSON body."""
+        try:
+            selections = _Parser(query, variables).document()
+            return {'data': {alias: self._resolve(name, arguments, children)
+                             for alias, name, arguments, children in selections}}
+        except GraphQLError as e:
+            return {'errors': [{'message': str(e)}]}
+
+
+def serve(subgraph, host='127.0.0.1', port=0):
+    """Serve ``subgraph`` over HTTP on a background thread; returns the server (see ``server_address``)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            payload = json.dumps(subgraph.execute(body.get('query', ''), body.get('variables'))).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic chest opens as a local subgraph")
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    events = synthetic.generate_events(args.events, args.users, seed=args.seed)
+    server = serve(MockSubgraph(events), args.host, args.port)
+    print(f"Serving {len(events)} chest opens at http://{args.host}:{server.server_address[1]}")
+    threading.Event().wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Synthetic DailyTreasureEvent activity for benchmarks.
+
+Human wallets open a chest now and then with a heavy-tailed activity level
+and a daily rhythm. Bot wallets belong to farms: every bot in a farm fires a
+burst of opens a few seconds apart at roughly the same time of day, which is
+the pattern the Sybil features and clustering are meant to pick up.
+"""
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from wod import store
+
+# 2024-10-09T00:00:00Z, the start of the event
+START = 1728432000
+SECONDS_PER_DAY = 86400
+# BSC produces a block about every three seconds
+BLOCK_SECONDS = 3
+FIRST_BLOCK = 42000000
+
+# Relative chance of a human open in each UTC hour
+HOURLY_ACTIVITY = np.array([2, 1, 1, 1, 1, 2, 3, 4, 5, 6, 6, 6, 7, 7, 7, 7, 8, 9, 10, 10, 9, 7, 5, 3], dtype=float)
+
+
+def _addresses(rng, n):
+    raw = rng.bytes(20 * n).hex()
+    return np.array(['0x' + raw[i:i + 40] for i in range(0, 40 * n, 40)])
+
+
+def generate_events(n_events=1000000, n_users=20000, bot_fraction=0.05, bot_share=0.4, farm_size=25,
+                    days=30, start=START, seed=0):
+    """Return ``n_events`` chest opens ordered by block and log index.
+
+    ``bot_fraction`` of the ``n_users`` wallets are bots producing
+    ``bot_share`` of all opens. The frame has the store's ``chest_openeds``
+    columns plus an ``isBot`` ground-truth flag.
+    """
+    rng = np.random.default_rng(seed)
+    n_bots = max(int(n_users * bot_fraction), 1)
+    n_humans = n_users - n_bots
+    addresses = _addresses(rng, n_users)
+
+    # Humans: activity follows a Pareto tail, times follow the daily rhythm
+    n_human_events = n_events - int(n_events * bot_share)
+    activity = rng.pareto(1.5, n_humans) + 1
+    human_users = rng.choice(n_humans, size=n_human_events, p=activity / activity.sum())
+    hours = rng.choice(24, size=n_human_events, p=HOURLY_ACTIVITY / HOURLY_ACTIVITY.sum())
+    human_times = (start + rng.integers(0, days, n_human_events) * SECONDS_PER_DAY
+                   + hours * 3600 + rng.integers(0, 3600, n_human_events))
+    human_premium = rng.random(n_human_events) < 0.1
+
+    # Bots: bursts of 5-25 opens 2-15 seconds apart, farms share a time slot
+    n_bot_events = n_events - n_human_events
+    n_bursts = max(n_bot_events // 15, 1)
+    burst_bots = rng.integers(0, n_bots, n_bursts)
+    farm_slot = rng.integers(0, SECONDS_PER_DAY - 3600, n_bots // farm_size + 1)
+    burst_starts = (start + rng.integers(0, days, n_bursts) * SECONDS_PER_DAY
+                    + farm_slot[burst_bots // farm_size] + rng.integers(0, 120, n_bursts))
+    lengths = rng.integers(5, 26, n_bursts)
+    lengths[-1] += max(n_bot_events - lengths.sum(), 0)
+    burst_of = np.repeat(np.arange(n_bursts), lengths)[:n_bot_events]
+    gaps = rng.integers(2, 16, len(burst_of))
+    offsets = np.cumsum(gaps)
+    first_of_burst = np.flatnonzero(np.r_[True, burst_of[1:] != burst_of[:-1]])
+    offsets -= np.repeat(offsets[first_of_burst] - gaps[first_of_burst], np.diff(np.r_[first_of_burst, len(burst_of)]))
+    bot_times = burst_starts[burst_of] + offsets
+    bot_premium = rng.random(len(burst_of)) < 0.02
+
+    user_index = np.concatenate([human_users, n_humans + burst_bots[burst_of]])
+    timestamps = np.concatenate([human_times, bot_times]).astype(np.int64)
+    order = np.argsort(timestamps, kind='stable')
+    user_index, timestamps = user_index[order], timestamps[order]
+    premium = np.concatenate([human_premium, bot_premium])[order]
+
+    block = FIRST_BLOCK + (timestamps - start) // BLOCK_SECONDS
+    new_block = np.r_[True, block[1:] != block[:-1]]
+    block_start = np.maximum.accumulate(np.where(new_block, np.arange(len(block)), 0))
+    log_index = np.arange(len(block)) - block_start
+
+    ids = [f'0x{i:064x}-{log}' for i, log in zip(range(len(block)), log_index.tolist())]
+    return pd.DataFrame({
+        'id': ids,
+        'user': addresses[user_index],
+        'timestamp': timestamps,
+        'isPremium': premium,
+        'blockNumber': block,
+        'logIndex': log_index,
+        'isBot': user_index >= n_humans,
+    })
+
+
+def users_table(events):
+    """Return the ``User`` rows implied by ``events``."""
+    grouped = events.groupby('user')['isPremium']
+    users = pd.DataFrame({'premium': grouped.sum(), 'total': grouped.size()})
+    return pd.DataFrame({
+        'id': users.index,
+        'lifetimeChestCount': (users['total'] - users['premium']).to_numpy(),
+        'lifetimePremiumChestCount': users['premium'].to_numpy(),
+        'lifetimeTotalChestCount': users['total'].to_numpy(),
+        'isPremiumUser': (users['premium'] > 0).to_numpy(),
+    })
+
+
+def _count_table(events, keys):
+    counts = events.groupby(keys)['isPremium'].agg(['sum', 'size']).reset_index()
+    counts['regularChestCount'] = counts['size'] - counts['sum']
+    counts['premiumChestCount'] = counts['sum']
+    counts['totalChestCount'] = counts['size']
+    return counts.drop(columns=['sum', 'size'])
+
+
+def _dates(timestamps):
+    days, inverse = np.unique(np.asarray(timestamps) // SECONDS_PER_DAY, return_inverse=True)
+    return np.asarray(pd.to_datetime(days * SECONDS_PER_DAY, unit='s').strftime('%Y-%m-%d'))[inverse]
+
+
+def daily_table(events):
+    """Return the ``DailyChestOpen`` rows implied by ``events``."""
+    days = _count_table(events.assign(date=_dates(events['timestamp'])), ['date'])
+    days.insert(0, 'id', days['date'])
+    return days
+
+
+def hourly_table(events, per_user=False):
+    """Return the ``HourlyChestOpen`` (or ``UserHourlyChestOpen``) rows implied by ``events``."""
+    hour_start = events['timestamp'] - events['timestamp'] % 3600
+    keys = ['user', 'hourStartTimestamp'] if per_user else ['hourStartTimestamp']
+    hours = _count_table(events.assign(hourStartTimestamp=hour_start), keys)
+    hours['date'] = _dates(hours['hourStartTimestamp'])
+    hours['hour'] = hours['hourStartTimestamp'] % SECONDS_PER_DAY // 3600
+    prefix = hours['user'] + '-' if per_user else ''
+    hours.insert(0, 'id', prefix + hours['hourStartTimestamp'].astype(str))
+    return hours
+
+
+def user_daily_table(events):
+    """Return the ``UserDailyChestOpen`` rows implied by ``events``."""
+    days = _count_table(events.assign(date=_dates(events['timestamp'])), ['user', 'date'])
+    days.insert(0, 'id', days['user'] + '-' + days['date'])
+    return days
+
+
+def write_store(events, path):
+    """Fill a local store at ``path`` as if it had been synced from a subgraph holding ``events``."""
+    columns = ['id', 'user', 'timestamp', 'isPremium', 'blockNumber', 'logIndex']
+    users = users_table(events)
+    days = daily_table(events)
+    with closing(store.connect(path)) as conn, conn:
+        conn.executemany('INSERT OR IGNORE INTO chest_openeds VALUES (?, ?, ?, ?, ?, ?)',
+                         events[columns].astype({'isPremium': int}).itertuples(index=False, name=None))
+        conn.executemany('INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?)',
+                         users.astype({'isPremiumUser': int}).itertuples(index=False, name=None))
+        conn.executemany('INSERT OR REPLACE INTO daily_chest_opens VALUES (?, ?, ?, ?)',
+                         days.drop(columns='id').itertuples(index=False, name=None))
+    return path
@@ -0,0 +1,30 @@
+import pytest
+
+from wod.clustering import METHODS, cluster, cluster_graph, neighbourhood_graph, scale_features
+from wod.features import extract_features
+
+EPS = 0.5
+MIN_SAMPLES = 25
+
+
+@pytest.fixture(scope='module')
+def X(events):
+    return scale_features(extract_features(events))
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_cluster(benchmark, X, method):
+    result = benchmark.pedantic(cluster, args=(X, method, EPS, MIN_SAMPLES), rounds=3, iterations=1)
+    benchmark.extra_info['peak_memory'] = cluster(X, method, EPS, MIN_SAMPLES, measure_memory=True).peak_memory
+    assert len(result.labels) == len(X)
+
+
+def test_neighbourhood_graph(benchmark, X):
+    graph = benchmark.pedantic(neighbourhood_graph, args=(X, EPS), rounds=3, iterations=1)
+    assert graph.shape == (len(X), len(X))
+
+
+def test_cluster_graph(benchmark, X):
+    graph = neighbourhood_graph(X, EPS)
+    result = benchmark(cluster_graph, graph, EPS, MIN_SAMPLES)
+    assert len(result.labels) == len(X)
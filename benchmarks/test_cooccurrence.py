@@ -0,0 +1,10 @@
+from wod import cooccurrence
+
+
+def test_correlated_pairs(benchmark, events):
+    pairs = benchmark.pedantic(cooccurrence.correlated_pairs, args=(events,), rounds=3, iterations=1)
+    groups = cooccurrence.timing_groups(pairs)
+    benchmark.extra_info['pairs'] = len(pairs)
+    benchmark.extra_info['groups'] = int(groups['group'].nunique()) if len(groups) else 0
+    # Synthetic farms fire together, humans open chests independently
+    assert set(groups['user_id']) <= set(events.loc[events['isBot'], 'user'])
@@ -0,0 +1,22 @@
+import pytest
+
+from wod.detector import BURST_THRESHOLD, BurstDetector
+
+
+@pytest.fixture(scope='module')
+def rows(events):
+    return list(zip(events['user'].tolist(), events['timestamp'].tolist(), events['blockNumber'].tolist()))
+
+
+def test_burst_detector(benchmark, events, rows):
+    def run():
+        detector = BurstDetector()
+        return detector, detector.process_rows(rows)
+
+    detector, alerts = benchmark.pedantic(run, rounds=3, iterations=1)
+    benchmark.extra_info['events'] = len(rows)
+    benchmark.extra_info['wallets'] = len(detector.wallets)
+    # A bot with too few opens in a small dataset cannot complete a burst yet
+    opens = events.loc[events['isBot'], 'user'].value_counts()
+    bots = set(opens.index[opens > BURST_THRESHOLD])
+    assert bots <= {alert.user for alert in alerts}
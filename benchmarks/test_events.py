@@ -0,0 +1,35 @@
+import pytest
+
+from wod import store
+from wod.events import ChestOpens
+from wod.features import extract_features
+
+PAGE_ROWS = 200000
+
+
+@pytest.fixture(scope='module')
+def pages(events):
+    head = events.iloc[:PAGE_ROWS]
+    rows = [{'timestamp': str(timestamp), 'isPremium': premium, 'user': {'id': user}}
+            for timestamp, premium, user in zip(head['timestamp'].tolist(), head['isPremium'].tolist(),
+                                                head['user'].tolist())]
+    return [rows[i:i + 1000] for i in range(0, len(rows), 1000)]
+
+
+def test_chest_opens_from_pages(benchmark, pages):
+    events = benchmark(ChestOpens.from_pages, pages)
+    benchmark.extra_info['bytes'] = events.nbytes
+    assert len(events) == sum(map(len, pages))
+
+
+def test_chest_opens_from_store(benchmark, events, store_path):
+    loaded = benchmark.pedantic(store.load_events, kwargs={'path': store_path}, rounds=3, iterations=1)
+    benchmark.extra_info['bytes'] = loaded.nbytes
+    benchmark.extra_info['frame_bytes'] = int(events[['user', 'timestamp', 'isPremium']].memory_usage(deep=True).sum())
+    assert len(loaded) == len(events)
+
+
+def test_extract_features_chest_opens(benchmark, store_path):
+    loaded = store.load_events(path=store_path)
+    features = benchmark.pedantic(extract_features, args=(loaded,), rounds=3, iterations=1)
+    assert len(features) == len(loaded.addresses)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from wod import feature_matrix
+from wod.features import extract_features
+
+
+@pytest.fixture(scope='module')
+def matrix_path(events, tmp_path_factory):
+    features = extract_features(events)
+    path = str(tmp_path_factory.mktemp('matrix') / 'features.npy')
+    feature_matrix.write_matrix([features], path, len(features))
+    return path
+
+
+def test_scaling_matches_sklearn(matrix_path):
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import StandardScaler
+
+    _, X = feature_matrix.open_matrix(matrix_path)
+    expected = StandardScaler().fit_transform(SimpleImputer(strategy='mean').fit_transform(X))
+    # Small chunks so that the moments of many chunks are merged
+    chunksize = max(len(X) // 7, 1)
+    X_scaled = feature_matrix.scale(X, feature_matrix.fit_scaling(X, chunksize), chunksize=chunksize)
+    np.testing.assert_allclose(X_scaled, expected, rtol=1e-12, atol=1e-12)
+
+
+def test_fit_scaling(benchmark, matrix_path):
+    _, X = feature_matrix.open_matrix(matrix_path)
+    scaling = benchmark(feature_matrix.fit_scaling, X)
+    assert scaling.count == len(X)
+
+
+def test_scale(benchmark, matrix_path, tmp_path):
+    _, X = feature_matrix.open_matrix(matrix_path)
+    scaling = feature_matrix.fit_scaling(X)
+    X_scaled = benchmark(feature_matrix.scale, X, scaling, str(tmp_path / 'scaled.npy'))
+    assert X_scaled.shape == X.shape
+
+
+def test_project(benchmark, matrix_path):
+    _, X = feature_matrix.open_matrix(matrix_path)
+    X_scaled = feature_matrix.scale(X, feature_matrix.fit_scaling(X))
+    projection, _ = benchmark.pedantic(feature_matrix.project, args=(X_scaled,), rounds=3, iterations=1)
+    assert projection.shape == (len(X), 2)
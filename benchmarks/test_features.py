@@ -0,0 +1,74 @@
+import shutil
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+import synthetic
+from scipy.stats import entropy
+
+from wod import feature_store
+from wod.features import BURST_SECONDS, FEATURE_COLUMNS, SECONDS_PER_DAY, extract_features
+
+# Users checked against the per-user loop, which is too slow for all of them
+REFERENCE_USERS = 500
+
+
+def reference_features(events, user_ids):
+    """The per-user loop that extract_features replaced, kept as the definition of each feature."""
+    rows = []
+    by_user = dict(tuple(events[events['user'].isin(user_ids)].groupby('user')))
+    for user_id in user_ids:
+        group = by_user[user_id].sort_values('timestamp', kind='stable')
+        timestamps = [int(timestamp) for timestamp in group['timestamp']]
+        intervals = [timestamps[i + 1] - timestamps[i] for i in range(len(timestamps) - 1)]
+        day_counts = pd.Series([timestamp // SECONDS_PER_DAY for timestamp in timestamps]).value_counts()
+        rows.append({
+            'user_id': user_id,
+            'total_chests': int((~group['isPremium']).sum()),
+            'premium_chests': int(group['isPremium'].sum()),
+            'avg_time_interval': sum(intervals) / len(intervals) if intervals else np.nan,
+            'burst_count': sum(1 for interval in intervals if interval < BURST_SECONDS) if len(intervals) > 1 else 0,
+            'daily_entropy': entropy(day_counts),
+        })
+    return pd.DataFrame(rows)
+
+
+def test_extract_features_matches_loop(events):
+    features = extract_features(events)
+    # An even spread over the address order, which mixes light and heavy users
+    sample = features.iloc[np.linspace(0, len(features) - 1, min(REFERENCE_USERS, len(features))).astype(int)]
+    expected = reference_features(events, sample['user_id'].tolist())
+    pd.testing.assert_frame_equal(sample.reset_index(drop=True), expected, check_dtype=False, check_exact=True)
+
+
+def test_extract_features(benchmark, events):
+    features = benchmark.pedantic(extract_features, args=(events,), rounds=3, iterations=1)
+    assert list(features.columns) == ['user_id'] + FEATURE_COLUMNS
+    assert len(features) == events['user'].nunique()
+
+
+def test_feature_store_rebuild(benchmark, store_path, tmp_path):
+    path = str(tmp_path / 'features.sqlite')
+    shutil.copy(store_path, path)
+    result = benchmark.pedantic(feature_store.update, args=(path,), kwargs={'rebuild': True}, rounds=1, iterations=1)
+    assert result['events'] > 0
+
+
+def test_feature_store_incremental(benchmark, events, store_path, tmp_path):
+    # Fold the first 99% of the events once, then time folding the last 1%
+    split = len(events) * 99 // 100
+    last = events.iloc[split - 1]
+    base = str(tmp_path / 'base.sqlite')
+    shutil.copy(store_path, base)
+    with closing(feature_store.connect(base)) as conn, conn:
+        conn.execute('DELETE FROM chest_openeds WHERE blockNumber > ? OR (blockNumber = ? AND logIndex > ?)',
+                     (int(last['blockNumber']), int(last['blockNumber']), int(last['logIndex'])))
+    feature_store.update(base)
+    path = str(tmp_path / 'features.sqlite')
+
+    def setup():
+        shutil.copy(base, path)
+        synthetic.write_store(events.iloc[split:], path)
+
+    result = benchmark.pedantic(feature_store.update, args=(path,), setup=setup, rounds=3, iterations=1)
+    assert result['events'] == len(events) - split
@@ -0,0 +1,31 @@
+import pytest
+
+import synthetic
+from wod import store
+from wod.heatmap import HeatmapBuilder
+
+END = synthetic.START + 30 * synthetic.SECONDS_PER_DAY
+
+
+@pytest.fixture(scope='module')
+def busiest_user(events):
+    return events['user'].value_counts().index[0]
+
+
+def _build(pages):
+    builder = HeatmapBuilder(synthetic.START, END).consume(pages)
+    return builder.frame(False), builder.frame(True), builder.recent_frame()
+
+
+def test_heatmap_all_events(benchmark, events):
+    chunks = [events.iloc[i:i + 10000] for i in range(0, len(events), 10000)]
+    regular, premium, _ = benchmark(_build, chunks)
+    assert regular.to_numpy().sum() + premium.to_numpy().sum() == len(events)
+
+
+def test_heatmap_from_store(benchmark, store_path, busiest_user):
+    def build():
+        return _build(store.iter_chest_opens(user=busiest_user, path=store_path))
+
+    regular, premium, recent = benchmark(build)
+    assert len(recent) == 100
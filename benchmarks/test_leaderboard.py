@@ -0,0 +1,35 @@
+import synthetic
+from wod import store
+from wod.leaderboard import leaderboard, top_n, window_counts_from_pages
+
+# The last seven days of the synthetic event
+WINDOW_START = synthetic.START + 23 * synthetic.SECONDS_PER_DAY
+
+
+def _pages(events, size=1000):
+    rows = [{'timestamp': str(timestamp), 'isPremium': premium, 'user': {'id': user}}
+            for timestamp, premium, user in zip(events['timestamp'].tolist(), events['isPremium'].tolist(),
+                                                events['user'].tolist())]
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+
+def test_window_counts_sql(benchmark, store_path):
+    counts = benchmark(store.window_counts, WINDOW_START, path=store_path)
+    assert len(counts)
+
+
+def test_window_counts_from_pages(benchmark, events):
+    pages = _pages(events[events['timestamp'] >= WINDOW_START])
+    counts = benchmark(window_counts_from_pages, pages)
+    assert counts['totalChestCount'].sum() == sum(map(len, pages))
+
+
+def test_top_n(benchmark, store_path):
+    counts = store.window_counts(WINDOW_START, path=store_path)
+    top = benchmark(top_n, counts, 'totalChestCount', 100)
+    assert len(top) == min(100, len(counts))
+
+
+def test_leaderboard(benchmark, store_path):
+    top = benchmark(leaderboard, WINDOW_START, n=100, path=store_path)
+    assert len(top) == 100
@@ -0,0 +1,94 @@
+"""Fetching throughput against the mock subgraph, in process and over HTTP."""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from wod.batch import BatchFetcher
+from wod.client import QueryError, SubgraphClient
+from wod.pagination import fetch_all
+from wod.response_cache import ResponseCache
+
+# Rows fetched per run, capped by the size of the synthetic dataset
+MAX_ROWS = 50000
+# Rows reachable with first/skip pages before graph-node's skip limit
+MAX_SKIP_ROWS = 5000
+FIELDS = '''
+        timestamp
+        isPremium
+        blockNumber
+        logIndex
+        user { id }
+'''
+SKIP_QUERY = '''
+query Page($first: Int!, $skip: Int!) {
+    users(first: $first, skip: $skip, orderBy: id) { id lifetimeTotalChestCount }
+}
+'''
+
+
+@pytest.fixture(scope='module')
+def client(subgraph_url):
+    return SubgraphClient(subgraph_url)
+
+
+@pytest.fixture(scope='module')
+def rows_limit(events):
+    return min(MAX_ROWS, len(events))
+
+
+@pytest.mark.parametrize('cursor', ['id', 'blockNumber', 'timestamp'])
+def test_keyset_in_process(benchmark, subgraph, cursor, rows_limit):
+    rows = benchmark.pedantic(fetch_all, args=('chestOpeneds', FIELDS), rounds=3, iterations=1,
+                              kwargs={'cursor': cursor, 'client': subgraph, 'limit': rows_limit})
+    benchmark.extra_info['rows'] = len(rows)
+    assert len(rows) == rows_limit
+
+
+@pytest.mark.parametrize('cursor', ['id', 'blockNumber'])
+def test_keyset_http(benchmark, client, cursor, rows_limit):
+    rows = benchmark.pedantic(fetch_all, args=('chestOpeneds', FIELDS), rounds=3, iterations=1,
+                              kwargs={'cursor': cursor, 'client': client, 'limit': rows_limit})
+    benchmark.extra_info['rows'] = len(rows)
+    assert len(rows) == rows_limit
+
+
+def test_skip_pages_http(benchmark, client, events):
+    # graph-node stops answering past skip=5000, so this is as far as skip pages go
+    rows = benchmark.pedantic(client.fetch_pages, args=(SKIP_QUERY, 'users'), kwargs={'max_rows': MAX_SKIP_ROWS},
+                              rounds=3, iterations=1)
+    assert len(rows) == min(MAX_SKIP_ROWS, events['user'].nunique())
+
+
+def test_skip_pages_past_limit(client, events):
+    if events['user'].nunique() < MAX_SKIP_ROWS + 1000:
+        pytest.skip("the dataset fits within the skip limit")
+    with pytest.raises(QueryError):
+        client.fetch_pages(SKIP_QUERY, 'users')
+
+
+def test_batch_users_http(benchmark, subgraph_url, events):
+    user_ids = events['user'].drop_duplicates().head(2000).tolist()
+    fetcher = BatchFetcher(subgraph_url)
+    users = benchmark.pedantic(fetcher.fetch_users, args=(user_ids,), rounds=3, iterations=1)
+    assert all(users[user_id] is not None for user_id in user_ids)
+
+
+def test_response_cache_sessions(benchmark, subgraph_url):
+    # Twenty sessions asking for the same pages share one request per page
+    def sessions():
+        client = SubgraphClient(subgraph_url, cache=ResponseCache())
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            results = list(executor.map(lambda _: fetch_all('chestOpeneds', FIELDS, cursor='blockNumber',
+                                                            client=client, limit=5000), range(20)))
+        return client, results
+
+    client, results = benchmark.pedantic(sessions, rounds=3, iterations=1)
+    benchmark.extra_info['cached_responses'] = len(client.cache)
+    assert all(rows == results[0] for rows in results)
+
+
+def test_keyset_adds_cursor_field(subgraph, rows_limit):
+    # Neither the cursor nor id is selected; both are added for the keyset
+    rows = fetch_all('chestOpeneds', 'isPremium', cursor='blockNumber', client=subgraph, limit=rows_limit)
+    assert len(rows) == rows_limit
+    assert all('blockNumber' in row and 'id' in row for row in rows)
@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+from wod import shards, store
+from wod.features import extract_features
+
+
+@pytest.fixture(scope='module')
+def single_process(store_path):
+    user_ids = sorted(store.load_users(store_path)['id'].tolist())
+    return extract_features(store.load_events(path=store_path), user_ids=user_ids)
+
+
+@pytest.mark.parametrize('workers', sorted({1, os.cpu_count() or 1}))
+def test_extract_features_parallel(benchmark, store_path, single_process, workers):
+    features = benchmark.pedantic(shards.extract_features_parallel, kwargs={'workers': workers, 'path': store_path},
+                                  rounds=3, iterations=1)
+    assert features.equals(single_process)
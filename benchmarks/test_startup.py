@@ -0,0 +1,52 @@
+"""Cold import cost of the app entrypoint and each page, measured with ``-X importtime``.
+
+Only the top-level imports of each script are run, in a fresh interpreter, so
+the numbers show what a visitor pays after a container restart before the
+page does any work of its own.
+"""
+import ast
+import glob
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'my_app')
+SCRIPTS = [os.path.join(APP_DIR, 'app.py')] + sorted(glob.glob(os.path.join(APP_DIR, 'pages', '*.py')))
+
+# Only loaded on the code paths that need them
+HEAVY_MODULES = ('sklearn', 'scipy', 'matplotlib', 'plotly')
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$')
+
+
+def _top_level_imports(path):
+    with open(path) as f:
+        source = f.read()
+    tree = ast.parse(source)
+    return '\n'.join(ast.get_source_segment(source, node) for node in tree.body
+                     if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def import_time(source):
+    """Run ``source`` with ``-X importtime``; return the cumulative microseconds per top-level module."""
+    env = dict(os.environ, PYTHONPATH=APP_DIR)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', source], cwd=APP_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and len(match.group(3)) == 1:
+            modules[match.group(4)] = int(match.group(2))
+    return modules
+
+
+@pytest.mark.parametrize('script', SCRIPTS, ids=lambda path: os.path.relpath(path, APP_DIR))
+def test_import_time(benchmark, script):
+    modules = benchmark.pedantic(import_time, args=(_top_level_imports(script),), rounds=3, iterations=1)
+    benchmark.extra_info['import_seconds'] = sum(modules.values()) / 1e6
+    benchmark.extra_info['slowest'] = sorted(modules, key=modules.get, reverse=True)[:5]
+    heavy = sorted(module for module in modules if module.split('.')[0] in HEAVY_MODULES)
+    assert not heavy, f"{script} imports {heavy} at startup"
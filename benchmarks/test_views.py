@@ -0,0 +1,69 @@
+import os
+
+import pandas as pd
+
+from wod import views
+
+NOW = 1730000000
+
+
+def tables(groups, value):
+    built = {}
+    for group in groups:
+        for name in views.TABLES[group]:
+            built[name] = pd.DataFrame({'id': ['0xa', '0xb'], 'value': [value, value + 1]})
+    return built
+
+
+def test_refresh(benchmark, events, store_path, tmp_path):
+    views_dir = str(tmp_path / 'views')
+    groups = ['leaderboards', 'daily', 'users']
+    # Windows end at the last synthetic event rather than at the wall clock
+    now = int(events['timestamp'].max()) + 1
+    version = benchmark.pedantic(views.refresh, args=(groups,), rounds=3, iterations=1,
+                                 kwargs={'path': store_path, 'views_dir': views_dir, 'now': now})
+    assert views.current_version(views_dir) == version
+    assert not views.load_view('leaderboard_7d', version, views_dir).empty
+
+
+def test_publish_copies_groups_and_swaps_pointer(tmp_path):
+    views_dir = str(tmp_path / 'views')
+    first = views.publish(tables(views.TABLES, 1), list(views.TABLES), views_dir=views_dir, now=NOW)
+    assert views.current_version(views_dir) == first
+
+    second = views.publish(tables(['daily'], 10), ['daily'], previous=first, views_dir=views_dir, now=NOW + 60)
+    assert second != first
+    assert views.current_version(views_dir) == second
+    # The rebuilt group is new, every other group is copied from the previous version
+    assert views.load_view('daily_chest_opens', second, views_dir)['value'].tolist() == [10, 11]
+    for name in views.TABLES['leaderboards'] + views.TABLES['users'] + views.TABLES['sybil']:
+        pd.testing.assert_frame_equal(views.load_view(name, second, views_dir),
+                                      views.load_view(name, first, views_dir))
+    meta = views.refreshed(second, views_dir)
+    assert meta['daily'][0] == NOW + 60
+    assert meta['leaderboards'][0] == NOW
+    # The old version stays readable until it is pruned
+    assert views.load_view('daily_chest_opens', first, views_dir)['value'].tolist() == [1, 2]
+
+
+def test_prune_keeps_latest_versions(tmp_path):
+    views_dir = str(tmp_path / 'views')
+    published = []
+    for i in range(5):
+        previous = published[-1] if published else None
+        published.append(views.publish(tables(['daily'], i), ['daily'], previous=previous, views_dir=views_dir,
+                                       keep=2, now=NOW + i * 60))
+    remaining = sorted(name for name in os.listdir(views_dir) if name.endswith('.sqlite'))
+    assert remaining == [f'{version}.sqlite' for version in published[-2:]]
+    assert views.load_view('leaderboard_1d', published[0], views_dir) is None
+    assert views.refreshed(published[0], views_dir) == {}
+
+
+def test_stale_snapshot_is_ignored(tmp_path):
+    views_dir = str(tmp_path / 'views')
+    version = views.publish(tables(['daily'], 0), ['daily'], views_dir=views_dir, now=NOW)
+    meta = views.refreshed(version, views_dir)
+    shortest = min(views.SCHEDULE.values())
+    assert views.is_fresh(meta, now=NOW + shortest)
+    assert not views.is_fresh(meta, now=NOW + (views.STALE_INTERVALS + 1) * shortest)
+    assert not views.is_fresh({}, now=NOW)
@@ -1,6 +1,6 @@
-import { ChestOpened, User, DailyChestOpen } from "../generated/schema";
+import { ChestOpened, User, DailyChestOpen, UserDailyChestOpen, HourlyChestOpen, UserHourlyChestOpen } from "../generated/schema";
 import { ChestOpened as ChestOpenedEvent, PremiumChestOpened as PremiumChestOpenedEvent, PremiumUserAdded, PremiumUserRemoved } from "../generated/DailyTreasureEvent/DailyTreasureEvent";
-import { BigInt } from "@graphprotocol/graph-ts";
+import { BigInt, ethereum } from "@graphprotocol/graph-ts";
 
 function getOrCreateUser(address: string): User {
   let user = User.load(address);
@@ -26,11 +26,69 @@ function getOrCreateDailyChestOpen(date: string): DailyChestOpen {
   return dailyChestOpen;
 }
 
+function getOrCreateUserDailyChestOpen(userId: string, date: string): UserDailyChestOpen {
+  let id = userId + "-" + date;
+  let userDailyChestOpen = UserDailyChestOpen.load(id);
+  if (userDailyChestOpen == null) {
+    userDailyChestOpen = new UserDailyChestOpen(id);
+    userDailyChestOpen.user = userId;
+    userDailyChestOpen.date = date;
+    userDailyChestOpen.regularChestCount = 0;
+    userDailyChestOpen.premiumChestCount = 0;
+    userDailyChestOpen.totalChestCount = 0;
+  }
+  return userDailyChestOpen;
+}
+
+function getOrCreateHourlyChestOpen(hourStart: BigInt): HourlyChestOpen {
+  let id = hourStart.toString();
+  let hourlyChestOpen = HourlyChestOpen.load(id);
+  if (hourlyChestOpen == null) {
+    hourlyChestOpen = new HourlyChestOpen(id);
+    hourlyChestOpen.hourStartTimestamp = hourStart;
+    hourlyChestOpen.date = getDateString(hourStart);
+    hourlyChestOpen.hour = getHourOfDay(hourStart);
+    hourlyChestOpen.regularChestCount = 0;
+    hourlyChestOpen.premiumChestCount = 0;
+    hourlyChestOpen.totalChestCount = 0;
+  }
+  return hourlyChestOpen;
+}
+
+function getOrCreateUserHourlyChestOpen(userId: string, hourStart: BigInt): UserHourlyChestOpen {
+  let id = userId + "-" + hourStart.toString();
+  let userHourlyChestOpen = UserHourlyChestOpen.load(id);
+  if (userHourlyChestOpen == null) {
+    userHourlyChestOpen = new UserHourlyChestOpen(id);
+    userHourlyChestOpen.user = userId;
+    userHourlyChestOpen.hourStartTimestamp = hourStart;
+    userHourlyChestOpen.date = getDateString(hourStart);
+    userHourlyChestOpen.hour = getHourOfDay(hourStart);
+    userHourlyChestOpen.regularChestCount = 0;
+    userHourlyChestOpen.premiumChestCount = 0;
+    userHourlyChestOpen.totalChestCount = 0;
+  }
+  return userHourlyChestOpen;
+}
+
 function getDateString(timestamp: BigInt): string {
   let date = new Date(timestamp.toI64() * 1000);
   return date.toISOString().split('T')[0]; // YYYY-MM-DD
 }
 
+// A transaction can emit several chest events, so the log index keeps ids unique
+function getEventId(event: ethereum.Event): string {
+  return event.transaction.hash.toHex() + "-" + event.logIndex.toString();
+}
+
+function getHourStart(timestamp: BigInt): BigInt {
+  return timestamp.minus(timestamp.mod(BigInt.fromI32(3600)));
+}
+
+function getHourOfDay(timestamp: BigInt): i32 {
+  return <i32>((timestamp.toI64() % 86400) / 3600); // 0-23 UTC
+}
+
 export function handleChestOpened(event: ChestOpenedEvent): void {
   let user = getOrCreateUser(event.params.user.toHex());
   let date = getDateString(event.block.timestamp);
@@ -44,9 +102,27 @@ export function handleChestOpened(event: ChestOpenedEvent): void {
   dailyChestOpen.totalChestCount = dailyChestOpen.totalChestCount + 1;
   dailyChestOpen.save();
 
-  let chestOpened = new ChestOpened(event.transaction.hash.toHex());
+  let userDailyChestOpen = getOrCreateUserDailyChestOpen(user.id, date);
+  userDailyChestOpen.regularChestCount = userDailyChestOpen.regularChestCount + 1;
+  userDailyChestOpen.totalChestCount = userDailyChestOpen.totalChestCount + 1;
+  userDailyChestOpen.save();
+
+  let hourStart = getHourStart(event.block.timestamp);
+  let hourlyChestOpen = getOrCreateHourlyChestOpen(hourStart);
+  hourlyChestOpen.regularChestCount = hourlyChestOpen.regularChestCount + 1;
+  hourlyChestOpen.totalChestCount = hourlyChestOpen.totalChestCount + 1;
+  hourlyChestOpen.save();
+
+  let userHourlyChestOpen = getOrCreateUserHourlyChestOpen(user.id, hourStart);
+  userHourlyChestOpen.regularChestCount = userHourlyChestOpen.regularChestCount + 1;
+  userHourlyChestOpen.totalChestCount = userHourlyChestOpen.totalChestCount + 1;
+  userHourlyChestOpen.save();
+
+  let chestOpened = new ChestOpened(getEventId(event));
   chestOpened.user = user.id;
   chestOpened.timestamp = event.block.timestamp;
+  chestOpened.blockNumber = event.block.number;
+  chestOpened.logIndex = event.logIndex;
   chestOpened.isPremium = false;
   chestOpened.save();
 }
@@ -64,9 +140,27 @@ export function handlePremiumChestOpened(event: PremiumChestOpenedEvent): void {
   dailyChestOpen.totalChestCount = dailyChestOpen.totalChestCount + 1;
   dailyChestOpen.save();
 
-  let chestOpened = new ChestOpened(event.transaction.hash.toHex());
+  let userDailyChestOpen = getOrCreateUserDailyChestOpen(user.id, date);
+  userDailyChestOpen.premiumChestCount = userDailyChestOpen.premiumChestCount + 1;
+  userDailyChestOpen.totalChestCount = userDailyChestOpen.totalChestCount + 1;
+  userDailyChestOpen.save();
+
+  let hourStart = getHourStart(event.block.timestamp);
+  let hourlyChestOpen = getOrCreateHourlyChestOpen(hourStart);
+  hourlyChestOpen.premiumChestCount = hourlyChestOpen.premiumChestCount + 1;
+  hourlyChestOpen.totalChestCount = hourlyChestOpen.totalChestCount + 1;
+  hourlyChestOpen.save();
+
+  let userHourlyChestOpen = getOrCreateUserHourlyChestOpen(user.id, hourStart);
+  userHourlyChestOpen.premiumChestCount = userHourlyChestOpen.premiumChestCount + 1;
+  userHourlyChestOpen.totalChestCount = userHourlyChestOpen.totalChestCount + 1;
+  userHourlyChestOpen.save();
+
+  let chestOpened = new ChestOpened(getEventId(event));
   chestOpened.user = user.id;
   chestOpened.timestamp = event.block.timestamp;
+  chestOpened.blockNumber = event.block.number;
+  chestOpened.logIndex = event.logIndex;
   chestOpened.isPremium = true;
   chestOpened.save();
 }
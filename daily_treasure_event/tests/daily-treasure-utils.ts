@@ -5,7 +5,7 @@ import {
   PremiumChestOpened,
   PremiumUserAdded,
   PremiumUserRemoved
-} from "../generated/DailyTreasure/DailyTreasure"
+} from "../generated/DailyTreasureEvent/DailyTreasureEvent"
 
 export function createChestOpenedEvent(
   user: Address,
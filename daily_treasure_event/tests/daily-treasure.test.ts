@@ -6,21 +6,49 @@ import {
   beforeAll,
   afterAll
 } from "matchstick-as/assembly/index"
-import { Address, BigInt } from "@graphprotocol/graph-ts"
-import { ExampleEntity } from "../generated/schema"
-import { ChestOpened } from "../generated/DailyTreasure/DailyTreasure"
-import { handleChestOpened } from "../src/mappings"
-import { createChestOpenedEvent } from "./daily-treasure-utils"
+import { Address, BigInt, Bytes, ethereum } from "@graphprotocol/graph-ts"
+import { handleChestOpened, handlePremiumChestOpened } from "../src/mappings"
+import { createChestOpenedEvent, createPremiumChestOpenedEvent } from "./daily-treasure-utils"
 
 // Tests structure (matchstick-as >=0.5.0)
 // https://thegraph.com/docs/en/developer/matchstick/#tests-structure-0-5-0
 
+const USER = "0x0000000000000000000000000000000000000001"
+// 2024-10-09T00:00:00Z
+const DAY_START = 1728432000
+
+// Every event below is emitted by the same transaction
+const TX_HASH = "0x00000000000000000000000000000000000000000000000000000000000000aa"
+let nextLogIndex = 0
+
+function setBlock(event: ethereum.Event, timestamp: BigInt): void {
+  event.block.timestamp = timestamp
+  event.block.number = BigInt.fromI32(1000)
+  event.transaction.hash = Bytes.fromHexString(TX_HASH)
+  event.logIndex = BigInt.fromI32(nextLogIndex)
+  nextLogIndex = nextLogIndex + 1
+}
+
+function openChest(secondsIntoDay: i32, isPremium: boolean): void {
+  let user = Address.fromString(USER)
+  let timestamp = BigInt.fromI32(DAY_START + secondsIntoDay)
+  if (isPremium) {
+    let event = createPremiumChestOpenedEvent(user, timestamp)
+    setBlock(event, timestamp)
+    handlePremiumChestOpened(event)
+  } else {
+    let event = createChestOpenedEvent(user, timestamp)
+    setBlock(event, timestamp)
+    handleChestOpened(event)
+  }
+}
+
 describe("Describe entity assertions", () => {
   beforeAll(() => {
-    let user = Address.fromString("0x0000000000000000000000000000000000000001")
-    let timestamp = BigInt.fromI32(234)
-    let newChestOpenedEvent = createChestOpenedEvent(user, timestamp)
-    handleChestOpened(newChestOpenedEvent)
+    openChest(7 * 3600 + 5, false)
+    openChest(7 * 3600 + 65, false)
+    openChest(7 * 3600 + 125, true)
+    openChest(9 * 3600, false)
   })
 
   afterAll(() => {
@@ -30,24 +58,60 @@ describe("Describe entity assertions", () => {
   // For more test scenarios, see:
   // https://thegraph.com/docs/en/developer/matchstick/#write-a-unit-test
 
-  test("ExampleEntity created and stored", () => {
-    assert.entityCount("ExampleEntity", 1)
-
-    // 0xa16081f360e3847006db660bae1c6d1b2e17ec2a is the default address used in newMockEvent() function
-    assert.fieldEquals(
-      "ExampleEntity",
-      "0xa16081f360e3847006db660bae1c6d1b2e17ec2a",
-      "user",
-      "0x0000000000000000000000000000000000000001"
-    )
-    assert.fieldEquals(
-      "ExampleEntity",
-      "0xa16081f360e3847006db660bae1c6d1b2e17ec2a",
-      "timestamp",
-      "234"
-    )
-
-    // More assert options:
-    // https://thegraph.com/docs/en/developer/matchstick/#asserts
+  test("ChestOpened ids are unique per log within a transaction", () => {
+    assert.entityCount("ChestOpened", 4)
+    let id = TX_HASH + "-2"
+    assert.fieldEquals("ChestOpened", id, "user", USER)
+    assert.fieldEquals("ChestOpened", id, "isPremium", "true")
+    assert.fieldEquals("ChestOpened", id, "blockNumber", "1000")
+    assert.fieldEquals("ChestOpened", id, "logIndex", "2")
+    assert.fieldEquals("ChestOpened", id, "timestamp", (DAY_START + 7 * 3600 + 125).toString())
+  })
+
+  test("User lifetime counters are updated", () => {
+    assert.fieldEquals("User", USER, "lifetimeChestCount", "3")
+    assert.fieldEquals("User", USER, "lifetimePremiumChestCount", "1")
+    assert.fieldEquals("User", USER, "lifetimeTotalChestCount", "4")
+  })
+
+  test("DailyChestOpen totals are updated", () => {
+    assert.entityCount("DailyChestOpen", 1)
+    assert.fieldEquals("DailyChestOpen", "2024-10-09", "regularChestCount", "3")
+    assert.fieldEquals("DailyChestOpen", "2024-10-09", "premiumChestCount", "1")
+    assert.fieldEquals("DailyChestOpen", "2024-10-09", "totalChestCount", "4")
+  })
+
+  test("UserDailyChestOpen aggregates per user and day", () => {
+    let id = USER + "-2024-10-09"
+    assert.entityCount("UserDailyChestOpen", 1)
+    assert.fieldEquals("UserDailyChestOpen", id, "user", USER)
+    assert.fieldEquals("UserDailyChestOpen", id, "date", "2024-10-09")
+    assert.fieldEquals("UserDailyChestOpen", id, "regularChestCount", "3")
+    assert.fieldEquals("UserDailyChestOpen", id, "premiumChestCount", "1")
+    assert.fieldEquals("UserDailyChestOpen", id, "totalChestCount", "4")
+  })
+
+  test("HourlyChestOpen aggregates per hour", () => {
+    let seventh = (DAY_START + 7 * 3600).toString()
+    let ninth = (DAY_START + 9 * 3600).toString()
+    assert.entityCount("HourlyChestOpen", 2)
+    assert.fieldEquals("HourlyChestOpen", seventh, "hourStartTimestamp", seventh)
+    assert.fieldEquals("HourlyChestOpen", seventh, "date", "2024-10-09")
+    assert.fieldEquals("HourlyChestOpen", seventh, "hour", "7")
+    assert.fieldEquals("HourlyChestOpen", seventh, "regularChestCount", "2")
+    assert.fieldEquals("HourlyChestOpen", seventh, "premiumChestCount", "1")
+    assert.fieldEquals("HourlyChestOpen", seventh, "totalChestCount", "3")
+    assert.fieldEquals("HourlyChestOpen", ninth, "hour", "9")
+    assert.fieldEquals("HourlyChestOpen", ninth, "totalChestCount", "1")
+  })
+
+  test("UserHourlyChestOpen aggregates per user and hour", () => {
+    let id = USER + "-" + (DAY_START + 7 * 3600).toString()
+    assert.entityCount("UserHourlyChestOpen", 2)
+    assert.fieldEquals("UserHourlyChestOpen", id, "user", USER)
+    assert.fieldEquals("UserHourlyChestOpen", id, "hour", "7")
+    assert.fieldEquals("UserHourlyChestOpen", id, "regularChestCount", "2")
+    assert.fieldEquals("UserHourlyChestOpen", id, "premiumChestCount", "1")
+    assert.fieldEquals("UserHourlyChestOpen", id, "totalChestCount", "3")
   })
 })
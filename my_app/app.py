@@ -1,16 +1,13 @@
 import streamlit as st
-from streamlit_extras.switch_page_button import switch_page
 
-st.set_page_config(page_title="Chest Analysis App", page_icon="📊")
-
-# Directly switch to the Leaderboard page on app start
-switch_page("Leaderboard")
-
-# Remove the heatmap button and related text
-st.title("Welcome to the Chest Analysis App")
-
-st.write("Use the sidebar to navigate to the Leaderboard page.")
-
-# Navigation button for the leaderboard
-if st.button("Go to Leaderboard"):
-    switch_page("Leaderboard")
+# This entrypoint runs before every page, so it only routes and imports nothing
+# heavy. The Leaderboard is the default page and renders straight away instead
+# of loading a welcome page and then switching.
+pages = [
+    st.Page("pages/1_Leaderboard.py", default=True),
+    st.Page("pages/2_Sybil_Scan.py"),
+    st.Page("pages/3_User_Details.py"),
+    st.Page("pages/4_Contract_Stats.py"),
+]
+
+st.navigation(pages).run()
@@ -1,10 +1,9 @@
-import requests
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 import os
+import sys
 import json
-
-load_dotenv()
+from wod import metrics
+from wod.client import QueryError, get_client
 
 CHEST_OPENS_QUERY = '''
 query GetChestOpens($startTime: BigInt!) {
@@ -16,21 +15,12 @@ query GetChestOpens($startTime: BigInt!) {
 '''
 
 def execute_query(query, variables):
-    url = os.getenv('SUBGRAPH_URL')
-    print(f"Using URL: {url}")
-    
-    print("\nSending request with variables:", variables)
-    response = requests.post(url, json={'query': query, 'variables': variables})
-    
-    print(f"\nStatus Code: {response.status_code}")
-    print("Response Headers:", response.headers)
-    
-    if response.status_code == 200:
-        result = response.json()
-        print("\nResponse JSON:", json.dumps(result, indent=2))
-        return result
-    else:
-        print("\nError Response:", response.text)
+    client = get_client()
+    print(f"Using URL: {client.url}")
+    try:
+        return client.execute(query, variables)
+    except QueryError as e:
+        print(f"\nQuery failed: {e}")
         return None
 
 def main():
@@ -44,7 +34,12 @@ def main():
     print(f"Date range: {start_date} to {end_date}")
     
     variables = {'startTime': start_timestamp}
+    samples = metrics.start_run()
     result = execute_query(CHEST_OPENS_QUERY, variables)
+
+    # Latency, payload size and row count of every request made above
+    print("\nRequests:")
+    sys.stdout.write(metrics.to_jsonl(samples))
     
     if result:
         if 'data' in result:
@@ -54,7 +49,7 @@ def main():
                 print("\nFirst chest open:", chest_opens[0])
         else:
             print("\nNo 'data' field in response")
-            print("Full response:", result)
+            print("Errors:", json.dumps(result.get('errors'), indent=2))
 
 if __name__ == "__main__":
     print("Starting debug script...")
@@ -1,117 +1,93 @@
 import streamlit as st
-import requests
-import pandas as pd
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
-import os
-from streamlit_extras.switch_page_button import switch_page
-
-load_dotenv()
+from wod.leaderboard import filter_counts, leaderboard, top_n
+from wod import metrics, views
+from wod.ui import STORE_TTL, debug_panel, ensure_store, paginate, start_metrics, views_version
 
 st.set_page_config(page_title="Leaderboard", page_icon="🏆")
-
-LEADERBOARD_QUERY = '''
-query GetChestLeaderboard($startTime: BigInt!, $isPremium: Boolean!) {
-    users(
-        orderBy: lifetimeTotalChestCount, 
-        orderDirection: desc, 
-        where: {
-            chestOpens_: {isPremium: $isPremium, timestamp_gte: $startTime},
-            lifetimeTotalChestCount_gt: 0
-        }
-    ) {
-        id
-        lifetimeChestCount
-        lifetimePremiumChestCount
-        lifetimeTotalChestCount
-        isPremiumUser
-    }
-}
-'''
-
-USER_HISTORY_QUERY = '''
-query UserStats($userId: ID!) {
-    user(id: $userId) {
-        id
-        lifetimeChestCount
-        lifetimePremiumChestCount
-        lifetimeTotalChestCount
-        isPremiumUser
-        chestOpens(orderBy: timestamp, orderDirection: desc) {
-            timestamp
-            isPremium
-        }
-    }
-}
-'''
-
-def execute_query(query, variables):
-    url = os.getenv('SUBGRAPH_URL')
-    response = requests.post(url, json={'query': query, 'variables': variables})
-    if response.status_code == 200:
-        return response.json()
-    else:
-        st.error(f"Query failed with status code {response.status_code}")
-        return None
+start_metrics()
 
 st.title('Chest Leaderboard')
 
+# With a views scheduler running, the windows it precomputes are offered
+version = views_version()
+
 # Filter options
-days = st.slider('Number of days to look back', 1, 30, 7)
+if version:
+    days = st.select_slider('Number of days to look back', views.LEADERBOARD_DAYS, 7)
+else:
+    days = st.slider('Number of days to look back', 1, 30, 7)
 is_premium = st.radio('Chest Type', ('Premium', 'Regular'))
 premium_users_only = st.checkbox('Show Premium Users Only')
 
-# Calculate start time based on the number of days
-start_time = int((datetime.now() - timedelta(days=days)).timestamp())
 is_premium_bool = True if is_premium == 'Premium' else False
 
 # Add sorting option after the chest type selection
 sort_by = st.radio('Sort By', ('Total Chests', 'Regular Chests', 'Premium Chests'))
+top = st.number_input('Number of users to show', min_value=10, value=100, step=100)
 
-# Fetch leaderboard data
-variables = {'startTime': start_time, 'isPremium': is_premium_bool}
-data = execute_query(LEADERBOARD_QUERY, variables)
+SORT_COLUMNS = {
+    'Total Chests': 'totalChestCount',
+    'Regular Chests': 'regularChestCount',
+    'Premium Chests': 'premiumChestCount',
+}
+
+@st.cache_data(ttl=STORE_TTL, show_spinner=False)
+def load_leaderboard(days, is_premium, sort_column, top, premium_users_only):
+    # Counts within the window, cached per window and filters until the next store sync
+    start_time = int((datetime.now() - timedelta(days=days)).timestamp())
+    chest_type = 'premium' if is_premium else 'regular'
+    return leaderboard(start_time, chest_type=chest_type, by=sort_column, n=top,
+                       premium_users_only=premium_users_only)
+
+@st.cache_data(ttl=STORE_TTL, show_spinner=False)
+def load_view_leaderboard(version, days, is_premium, sort_column, top, premium_users_only):
+    # Counts were aggregated by the scheduler; only the filters and the top rows are applied here
+    counts = views.load_view(f'leaderboard_{days}d', version)
+    if counts is None:
+        # Pruned by the scheduler since the version was read
+        return None
+    chest_type = 'premium' if is_premium else 'regular'
+    return top_n(filter_counts(counts, chest_type, premium_users_only), by=sort_column, n=top)
 
-if data:
-    users = data.get('data', {}).get('users', [])
-    if users:
-        df = pd.DataFrame(users)
-        
-        # Filter for premium users if checkbox is selected
-        if premium_users_only:
-            df = df[df['isPremiumUser'] == True]
-        
-        # Sort based on user selection
-        if sort_by == 'Total Chests':
-            df = df.sort_values('lifetimeTotalChestCount', ascending=False)
-        elif sort_by == 'Regular Chests':
-            df = df.sort_values('lifetimeChestCount', ascending=False)
-        else:  # Premium Chests
-            df = df.sort_values('lifetimePremiumChestCount', ascending=False)
-            
-        st.subheader('Leaderboard')
-        
-        # Rename columns for better display
-        df_display = df.rename(columns={
-            'id': 'User Address',
-            'lifetimeChestCount': 'Regular Chests',
-            'lifetimePremiumChestCount': 'Premium Chests',
-            'lifetimeTotalChestCount': 'Total Chests',
-            'isPremiumUser': 'Premium User'
-        })
-        
-        # Make the dataframe clickable and add BSCScan link
-        def make_clickable(address):
-            app_link = f'<a href="User_Details?user_id={address}">{address}</a>'
-            # Using BSCScan or Binance logo image
-            bscscan_link = f'<a href="https://www.bscscan.com/address/{address}" target="_blank"><img src="https://bscscan.com/images/favicon.ico" width="16" height="16" style="vertical-align: middle;"></a>'
-            return f'{app_link} {bscscan_link}'
-        
-        df_display['User Address'] = df_display['User Address'].apply(make_clickable)
-        st.write(df_display.to_html(escape=False, index=False), unsafe_allow_html=True)
-    else:
-        st.write('No data available for the selected filters.')
+# Read leaderboard data from the precomputed views, or from the local store
+df = None
+if version:
+    df = load_view_leaderboard(version, days, is_premium_bool, SORT_COLUMNS[sort_by], top, premium_users_only)
+if df is None:
+    ensure_store()
+    df = load_leaderboard(days, is_premium_bool, SORT_COLUMNS[sort_by], top, premium_users_only)
+
+if not df.empty:
+    st.subheader('Leaderboard')
+
+    # Only the selected page is sent to the browser, whatever the number of rows
+    page = paginate(df, 'leaderboard')
+
+    # Links are built for the whole page at once and drawn by the grid, not as HTML
+    with metrics.timed('leaderboard table', rows=len(page)):
+        st.dataframe(
+            page.assign(
+                id='User_Details?user_id=' + page['id'],
+                bscscan='https://www.bscscan.com/address/' + page['id'],
+            ),
+            column_order=['id', 'bscscan', 'regularChestCount', 'premiumChestCount', 'totalChestCount',
+                          'isPremiumUser'],
+            column_config={
+                'id': st.column_config.LinkColumn('User Address', display_text=r'user_id=(.*)$'),
+                'bscscan': st.column_config.LinkColumn('BSCScan', display_text='🔗'),
+                'regularChestCount': 'Regular Chests',
+                'premiumChestCount': 'Premium Chests',
+                'totalChestCount': 'Total Chests',
+                'isPremiumUser': 'Premium User',
+            },
+            hide_index=True,
+        )
+else:
+    st.write('No data available for the selected filters.')
 
 # Add a button to navigate to the Contract Stats page
 if st.button("View Contract Stats"):
-    switch_page("Contract Stats")
+    st.switch_page("pages/4_Contract_Stats.py")
+
+debug_panel()
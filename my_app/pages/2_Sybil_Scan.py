@@ -1,49 +1,143 @@
+import os
+import threading
+import time
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import DBSCAN
-from sklearn.impute import SimpleImputer
-from sklearn.decomposition import PCA
+from wod import metrics, views
+from wod.clustering import (METHODS, ClusterResult, cluster, cluster_graph, file_hash, fit_scaling,
+                            neighbourhood_graph)
+from wod.ui import debug_panel, start_metrics, views_snapshot
+
+# Largest eps offered by the slider
+MAX_EPS = 1.0
+# Exact DBSCAN reuses a cached neighbourhood graph only up to this many wallets;
+# the graph grows with the square of the wallet count (129M edges for 20k
+# wallets at radius 1.0), so larger scans go through cluster() directly
+GRAPH_MAX_ROWS = 5000
 
-# Load the data from CSV
 file_path = 'user_data_features.csv'
-X = pd.read_csv(file_path)
+# Stands in for the feature file when the scan comes from the precomputed views
+VIEWS_SOURCE = 'views'
+
+start_metrics()
+
+
+@st.cache_data(show_spinner=False)
+def feature_file_hash(path, mtime_ns, size):
+    return file_hash(path)
+
+
+@st.cache_resource(show_spinner="Fitting feature scaling...")
+def prepare_scan(path, digest):
+    # Load the data, impute NaN values with column means, normalize and project once per file version
+    if path == VIEWS_SOURCE:
+        # The scheduler already clustered and projected this views version
+        scan = views.load_view('sybil_scan', digest)
+        if scan is None:
+            # Pruned by the scheduler since the version was read
+            return None
+        X = scan.drop(columns=['cluster', 'pca_x', 'pca_y'])
+        imputer, scaler, X_scaled = fit_scaling(X)
+        return {'features': X, 'imputer': imputer, 'scaler': scaler, 'X_scaled': X_scaled, 'pca': None,
+                'X_pca': scan[['pca_x', 'pca_y']].to_numpy(), 'labels': scan['cluster'].to_numpy()}
+
+    from sklearn.decomposition import PCA
+
+    X = pd.read_csv(path)
+    imputer, scaler, X_scaled = fit_scaling(X)
+    pca = PCA(n_components=2)
+    X_pca = pca.fit_transform(X_scaled)
+    return {'features': X, 'imputer': imputer, 'scaler': scaler, 'X_scaled': X_scaled, 'pca': pca, 'X_pca': X_pca}
+
 
-# Handle NaN values by imputing with the mean of each column
-imputer = SimpleImputer(strategy='mean')
-X_numeric = X.drop(columns=["user_id"])  # Keep all columns except 'user_id'
-X_imputed = imputer.fit_transform(X_numeric)
+@st.cache_resource(show_spinner=False)
+def graph_cache(path, digest):
+    # One graph per feature file version, covering the largest eps asked for so far
+    return {'lock': threading.Lock(), 'radius': 0.0, 'graph': None}
 
-# Normalize the features
-X_scaled = StandardScaler().fit_transform(X_imputed)
 
-# Apply DBSCAN
-dbscan = DBSCAN(eps=0.5, min_samples=5)  # Tune these parameters
-X['cluster'] = dbscan.fit_predict(X_scaled)
+def scan_graph(path, digest, eps):
+    """Return a neighbourhood graph covering ``eps`` and the seconds spent building it in this call."""
+    cache = graph_cache(path, digest)
+    with cache['lock']:
+        if cache['graph'] is not None and cache['radius'] >= eps:
+            return cache['graph'], 0.0
+        start = time.perf_counter()
+        cache['graph'] = neighbourhood_graph(prepare_scan(path, digest)['X_scaled'], eps)
+        cache['radius'] = eps
+        return cache['graph'], time.perf_counter() - start
+
+
+@st.cache_data(show_spinner="Clustering...")
+def scan_labels(path, digest, method, eps, min_samples, precomputed=False):
+    if precomputed:
+        return ClusterResult(prepare_scan(path, digest)['labels'], 0.0, None)
+    X_scaled = prepare_scan(path, digest)['X_scaled']
+    if method == 'dbscan' and len(X_scaled) <= GRAPH_MAX_ROWS:
+        graph, build_seconds = scan_graph(path, digest, eps)
+        result = cluster_graph(graph, eps=eps, min_samples=min_samples)
+        result = result._replace(seconds=result.seconds + build_seconds)
+    else:
+        result = cluster(X_scaled, method, eps=eps, min_samples=min_samples)
+    metrics.record('cluster', method, result.seconds, rows=len(result.labels), peak_memory=result.peak_memory)
+    return result
+
+
+# Prefer the scan precomputed by the views scheduler, which also sets the starting parameters
+version, meta = views_snapshot()
+params = meta.get('sybil', (None, None))[1]
+scan = prepare_scan(VIEWS_SOURCE, version) if params else None
+if scan is not None:
+    file_path, digest = VIEWS_SOURCE, version
+elif not os.path.exists(file_path):
+    st.title('Sybil Scan Results')
+    st.warning(f"{file_path} not found; run sybil/sybil_detection.py first.")
+    debug_panel()
+    st.stop()
+else:
+    stat = os.stat(file_path)
+    digest = feature_file_hash(file_path, stat.st_mtime_ns, stat.st_size)
+    params = {'method': METHODS[0], 'eps': 0.5, 'min_samples': 5}
+    scan = prepare_scan(file_path, digest)
+
+# Clustering parameters
+method = st.sidebar.selectbox('Clustering backend', METHODS, index=METHODS.index(params['method']))
+eps = st.sidebar.slider('eps', 0.05, MAX_EPS, params['eps'], 0.05)
+min_samples = st.sidebar.slider('min_samples', 2, 50, params['min_samples'])
+
+precomputed = file_path == VIEWS_SOURCE and params == {'method': method, 'eps': eps, 'min_samples': min_samples}
+result = scan_labels(file_path, digest, method, eps, min_samples, precomputed)
+X = scan['features'].assign(cluster=result.labels)
 
 # Identify potential Sybils by looking at clusters with multiple users
 sybil_clusters = X[X['cluster'] != -1].groupby('cluster').filter(lambda x: len(x) > 1)
 
 # Display Sybil scan results
 st.title('Sybil Scan Results')
+if precomputed:
+    st.caption(f"{method} clustering precomputed by the views scheduler ({digest})")
+else:
+    st.caption(f"{method} clustering took {result.seconds:.2f}s")
 if not sybil_clusters.empty:
     st.write(f"Potential Sybil clusters found: {sybil_clusters['cluster'].unique()}")
     st.write(f"Number of users in potential Sybil clusters: {len(sybil_clusters)}")
 else:
     st.write("No potential Sybil clusters found.")
 
-# Perform PCA for visualization
-pca = PCA(n_components=2)
-X_pca = pca.fit_transform(X_scaled)
+# Plot the cached PCA projection
+with metrics.timed('pca plot', rows=len(X)):
+    import matplotlib.pyplot as plt
+
+    X_pca = scan['X_pca']
+    fig, ax = plt.subplots(figsize=(10, 7))
+    scatter = ax.scatter(X_pca[:, 0], X_pca[:, 1], c=X['cluster'], cmap='viridis', marker='o', edgecolor='k', s=50)
+    ax.set_title('PCA of User Data')
+    ax.set_xlabel('PCA Component 1')
+    ax.set_ylabel('PCA Component 2')
+    plt.colorbar(scatter, ax=ax, label='Cluster Label')
 
-# Plot the PCA results
-fig, ax = plt.subplots(figsize=(10, 7))
-scatter = ax.scatter(X_pca[:, 0], X_pca[:, 1], c=X['cluster'], cmap='viridis', marker='o', edgecolor='k', s=50)
-ax.set_title('PCA of User Data')
-ax.set_xlabel('PCA Component 1')
-ax.set_ylabel('PCA Component 2')
-plt.colorbar(scatter, ax=ax, label='Cluster Label')
+    # Display the plot in Streamlit
+    st.pyplot(fig)
+    plt.close(fig)
 
-# Display the plot in Streamlit
-st.pyplot(fig) 
\ No newline at end of file
+debug_panel()
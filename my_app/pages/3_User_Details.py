@@ -1,96 +1,59 @@
+import time
 import streamlit as st
-import requests
-import pandas as pd
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
-import os
-from streamlit_extras.switch_page_button import switch_page
-import plotly.express as px
-
-load_dotenv()
+from wod import metrics, store
+from wod.heatmap import HeatmapBuilder
+from wod.prefetch import Prefetcher
+from wod.ui import STORE_TTL, debug_panel, ensure_store, start_metrics, views_version
+from wod.views import load_view
 
 st.set_page_config(page_title="User Details", page_icon="👤")
+start_metrics()
 
-# Define the execute_query function
-def execute_query(query, variables):
-    url = os.getenv('SUBGRAPH_URL')
-    response = requests.post(url, json={'query': query, 'variables': variables})
-    if response.status_code == 200:
-        return response.json()
-    else:
-        st.error(f"Query failed with status code {response.status_code}")
-        return None
-
-USER_DETAILS_QUERY = '''
-query UserDetails($userId: ID!) {
-    user(id: $userId) {
-        id
-        lifetimeChestCount
-        lifetimePremiumChestCount
-        lifetimeTotalChestCount
-        isPremiumUser
-        chestOpens(orderBy: timestamp, orderDirection: desc) {
-            timestamp
-            isPremium
-        }
-    }
-}
-'''
-
-CHEST_OPENS_QUERY = '''
-query GetChestOpens($startTime: BigInt!, $endTime: BigInt!, $user: String!, $first: Int!, $skip: Int!) {
-    chestOpeneds(
-        orderBy: timestamp, 
-        orderDirection: asc, 
-        where: {
-            timestamp_gte: $startTime,
-            timestamp_lte: $endTime,
-            user: $user
-        },
-        first: $first,
-        skip: $skip
-    ) {
-        timestamp
-        isPremium
-        user
-    }
-}
-'''
-
-LEADERBOARD_QUERY = '''
-query GetChestLeaderboard($startTime: BigInt!, $isPremium: Boolean!) {
-    users(
-        orderBy: lifetimeTotalChestCount, 
-        orderDirection: desc, 
-        where: {
-            chestOpens_: {isPremium: $isPremium, timestamp_gte: $startTime},
-            lifetimeTotalChestCount_gt: 0
-        }
-    ) {
-        id
-        lifetimeChestCount
-        lifetimePremiumChestCount
-        lifetimeTotalChestCount
-        isPremiumUser
-    }
-}
-'''
+# Number of most recent opens listed above the heatmaps
+RECENT_OPENS = 100
+
+# Set default start and end dates
+default_start_date = datetime(2024, 10, 9)
+default_end_date = datetime(2024, 11, 11)
 
 # Fetch leaderboard data to get the list of users
-def fetch_leaderboard_users():
+@st.cache_data(ttl=STORE_TTL, show_spinner=False)
+def fetch_leaderboard_users(version=None):
+    if version:
+        users = load_view('active_users', version)
+        # None once the scheduler has pruned the version
+        return users['id'].tolist() if users is not None else None
     start_time = int((datetime.now() - timedelta(days=7)).timestamp())  # Example: last 7 days
-    variables = {'startTime': start_time, 'isPremium': False}  # Adjust as needed
-    data = execute_query(LEADERBOARD_QUERY, variables)
-    if data:
-        return [user['id'] for user in data.get('data', {}).get('users', [])]
-    return []
+    return store.ranked_active_users(start_time, is_premium=False)  # Adjust as needed
+
+def load_user_view(user_id, start_time, end_time, sync_bucket):
+    # Everything the page shows for one user; runs on the prefetch threads.
+    # sync_bucket only keys the cache so views expire along with store syncs
+    user = store.load_user(user_id)
+    heatmap = HeatmapBuilder(start_time, end_time, recent=RECENT_OPENS)
+    if user:
+        with metrics.timed('heatmap', kind='compute') as sample:
+            # Chunks are folded in as they are read, so the history never sits in memory
+            heatmap.consume(store.iter_chest_opens(start_time, end_time, user_id))
+            sample['rows'] = heatmap.total
+    return user, heatmap
+
+@st.cache_resource
+def user_views():
+    # Shared by all sessions, so neighbours prefetched for one analyst are reused by others
+    return Prefetcher(load_user_view, maxsize=64, max_workers=4)
 
 # Initialize session state for user navigation
 if 'user_index' not in st.session_state:
     st.session_state.user_index = 0
 
 # Fetch the list of users
-user_list = fetch_leaderboard_users()
+version = views_version()
+user_list = fetch_leaderboard_users(version) if version else None
+if user_list is None:
+    ensure_store()
+    user_list = fetch_leaderboard_users()
 
 # Navigation buttons
 col1, col2, col3 = st.columns([1, 2, 1])
@@ -104,42 +67,30 @@ with col3:
 # Get the current user_id from the list
 user_id = user_list[st.session_state.user_index] if user_list else None
 
-def fetch_all_chest_opens(startTime, endTime, user):
-    all_chest_opens = []
-    first = 100
-    skip = 0
-    while True:
-        variables = {
-            'startTime': startTime,
-            'endTime': endTime,
-            'user': user,
-            'first': first,
-            'skip': skip
-        }
-        result = execute_query(CHEST_OPENS_QUERY, variables)
-        if result and 'data' in result:
-            chest_opens = result['data'].get('chestOpeneds', [])
-            if not chest_opens:
-                break
-            all_chest_opens.extend(chest_opens)
-            skip += first
-        else:
-            break
-    return all_chest_opens
-
 # Back button
 if st.button("← Back to Leaderboard"):
-    switch_page("Leaderboard")
+    st.switch_page("pages/1_Leaderboard.py")
 
 if not user_id:
     st.warning("No user selected. Please select a user from the leaderboard.")
     if st.button("Go to Leaderboard"):
-        switch_page("Leaderboard")
+        st.switch_page("pages/1_Leaderboard.py")
 else:
-    user_data = execute_query(USER_DETAILS_QUERY, {'userId': user_id})
+    # The slider below keeps its value in session state, so the range is known before it is drawn
+    start_date, end_date = st.session_state.get('date_range', (default_start_date, default_end_date))
+    start_time = int(datetime.combine(start_date, datetime.min.time()).timestamp())
+    end_time = int(datetime.combine(end_date, datetime.max.time()).timestamp())
+
+    views = user_views()
+    sync_bucket = int(time.time() // STORE_TTL)
+    user, heatmap = views.get((user_id, start_time, end_time, sync_bucket))
+
+    # Load the users on either side in the background so Previous/Next is instant
+    index = st.session_state.user_index
+    neighbours = user_list[max(index - 1, 0):index] + user_list[index + 1:index + 2]
+    views.prefetch((neighbour, start_time, end_time, sync_bucket) for neighbour in neighbours)
     
-    if user_data and 'data' in user_data and user_data['data']['user']:
-        user = user_data['data']['user']
+    if user:
         
         # User header
         st.title(f"User Details")
@@ -160,11 +111,20 @@ else:
             
         st.write(f"Premium User: {'Yes ✨' if user['isPremiumUser'] else 'No'}")
         
+        # Add a date range slider to the Streamlit app
+        st.slider(
+            "Select Date Range",
+            min_value=default_start_date,
+            max_value=default_end_date,
+            value=(default_start_date, default_end_date),
+            format="YYYY-MM-DD",
+            key='date_range'
+        )
+
         # Chest opening history
         st.subheader("Recent Chest Opens")
-        if user['chestOpens']:
-            df = pd.DataFrame(user['chestOpens'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'].astype(int), unit='s')
+        if heatmap.total:
+            df = heatmap.recent_frame()
             df['chest_type'] = df['isPremium'].map({True: 'Premium', False: 'Regular'})
             df = df.drop('isPremium', axis=1)
             
@@ -172,67 +132,32 @@ else:
                 df.rename(columns={
                     'timestamp': 'Time',
                     'chest_type': 'Chest Type'
-                }).sort_values('Time', ascending=False),
+                }),
                 hide_index=True
             )
         else:
             st.info("No chest opening history available")
-        
-        # Set default start and end dates
-        default_start_date = datetime(2024, 10, 9)
-        default_end_date = datetime(2024, 11, 11)
-
-        # Add a date range slider to the Streamlit app
-        start_date, end_date = st.slider(
-            "Select Date Range",
-            min_value=default_start_date,
-            max_value=default_end_date,
-            value=(default_start_date, default_end_date),
-            format="YYYY-MM-DD"
-        )
-
-        # Fetch chest opening data for heatmap
-        variables = {
-            'startTime': int(datetime.combine(start_date, datetime.min.time()).timestamp()),
-            'endTime': int(datetime.combine(end_date, datetime.max.time()).timestamp()),
-            'user': user['id']
-        }
-        chest_opens = fetch_all_chest_opens(variables['startTime'], variables['endTime'], variables['user'])
 
         # Process the result for heatmap
-        if chest_opens:
-            df = pd.DataFrame(chest_opens)
-            df['timestamp'] = pd.to_datetime(df['timestamp'].astype(int), unit='s')
-            df['date'] = df['timestamp'].dt.date
-            df['hour'] = df['timestamp'].dt.hour
-            
-            st.subheader(f'Total Chest Opens for {user["id"]}: {len(df)}')
-            
-            # Determine the full date range from the data
-            min_date = df['date'].min()
-            max_date = df['date'].max()
+        if heatmap.total:
+            st.subheader(f'Total Chest Opens for {user["id"]}: {heatmap.total}')
             
             # Create heatmaps for both chest types
+            import plotly.express as px
+
             for chest_type in [False, True]:
-                chest_data = df[df['isPremium'] == chest_type]
-                pivot_data = pd.pivot_table(
-                    chest_data,
-                    values='timestamp',
-                    index='date',
-                    columns='hour',
-                    aggfunc='count',
-                    fill_value=0
-                ).reindex(index=pd.date_range(min_date, max_date), columns=range(24), fill_value=0)
-                
-                fig = px.imshow(
-                    pivot_data,
-                    title=f'{"Premium" if chest_type else "Regular"} Chest Opens - Full Date Range',
-                    labels=dict(x='Hour of Day', y='Date', color='Number of Opens'),
-                    aspect='auto',
-                    x=list(range(24))
-                )
-                st.plotly_chart(fig)
+                with metrics.timed('premium heatmap' if chest_type else 'regular heatmap'):
+                    fig = px.imshow(
+                        heatmap.frame(chest_type),
+                        title=f'{"Premium" if chest_type else "Regular"} Chest Opens - Full Date Range',
+                        labels=dict(x='Hour of Day', y='Date', color='Number of Opens'),
+                        aspect='auto',
+                        x=list(range(24))
+                    )
+                    st.plotly_chart(fig)
         else:
             st.warning(f"No chest opens found for {user['id']} in the available data range")
     else:
-        st.error("Failed to load user data")
\ No newline at end of file
+        st.error("Failed to load user data")
+
+debug_panel()
@@ -1,68 +1,79 @@
+import os
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import requests
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from datetime import datetime, timezone
+from wod import metrics, store, views
+from wod.client import QueryError
+from wod.ui import STORE_TTL, debug_panel, start_metrics, views_version
 
 st.set_page_config(page_title="Contract Stats Debug", page_icon="🔍")
+start_metrics()
+
+# Seconds between refreshes of the day that is still filling up
+TODAY_TTL = int(os.getenv('WOD_TODAY_TTL', '60'))
+
+
+def daily_frame(df):
+    # Index the daily totals by date once, inside the cached loaders
+    df = df.set_index(pd.to_datetime(df['date'])).drop(columns='date')
+    df.index.name = 'date'
+    return df
+
+
+@st.cache_data(ttl=TODAY_TTL, show_spinner=False)
+def refresh_daily(today):
+    # Only days from the newest stored date on are requested from the subgraph
+    return store.sync_daily_chest_opens()
+
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_history(today):
+    # Closed days never change, so they are read and converted once per day;
+    # the key changes at midnight UTC and only the latest days are kept
+    return daily_frame(store.load_daily_chest_opens(before=today))
+
+
+@st.cache_data(ttl=TODAY_TTL, show_spinner=False)
+def load_today(today):
+    return daily_frame(store.load_daily_chest_opens(since=today))
+
+
+@st.cache_data(ttl=STORE_TTL, show_spinner=False)
+def load_view_daily(version):
+    df = views.load_view('daily_chest_opens', version)
+    # None once the scheduler has pruned the version
+    return daily_frame(df) if df is not None else None
 
-# Define a query to fetch all DailyChestOpen entities
-FETCH_ALL_DAILY_CHEST_OPENS_QUERY = '''
-query FetchAllDailyChestOpens {
-    dailyChestOpens(orderBy: date, orderDirection: asc) {
-        date
-        regularChestCount
-        premiumChestCount
-        totalChestCount
-    }
-}
-'''
-
-def execute_query(query):
-    url = os.getenv('SUBGRAPH_URL')
-    response = requests.post(url, json={'query': query})
-    if response.status_code == 200:
-        return response.json()
-    else:
-        st.error(f"Query failed with status code {response.status_code}")
-        return None
-
-def fetch_all_daily_chest_opens():
-    result = execute_query(FETCH_ALL_DAILY_CHEST_OPENS_QUERY)
-    if result and 'data' in result:
-        return result['data'].get('dailyChestOpens', [])
-    else:
-        return []
 
 st.title('Daily Chest Opens Debug')
 
-# Fetch all DailyChestOpen entities
-daily_chest_opens = fetch_all_daily_chest_opens()
-
-if daily_chest_opens:
-    # Convert the data to a DataFrame
-    df = pd.DataFrame(daily_chest_opens)
-    
-    # Convert 'date' to datetime
-    df['date'] = pd.to_datetime(df['date'])
-    
-    # Set 'date' as the index
-    df.set_index('date', inplace=True)
-    
+version = views_version()
+# Kept fresh by the views scheduler, so the page never queries the subgraph
+df = load_view_daily(version) if version else None
+if df is None:
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    try:
+        refresh_daily(today)
+    except QueryError as e:
+        st.warning(f"Showing locally stored data, sync failed: {e}")
+    df = pd.concat([load_history(today), load_today(today)])
+
+if not df.empty:
     # Display the DataFrame for debugging
     st.write("DataFrame:", df)
 
-    # Plotting
-    fig, ax = plt.subplots(figsize=(10, 6))
-    df[['regularChestCount', 'premiumChestCount']].plot(kind='bar', stacked=True, ax=ax, color=['#1f77b4', '#ff7f0e'])
-    ax.set_title('Daily Chest Opens')
-    ax.set_xlabel('Date')
-    ax.set_ylabel('Number of Opens')
-    ax.legend(title='Chest Type')
-    plt.xticks(rotation=45)
-    st.pyplot(fig)
+    # Drawn by the browser from the cached frame
+    with metrics.timed('daily chart', rows=len(df)):
+        st.bar_chart(
+            df[['regularChestCount', 'premiumChestCount']].rename(columns={
+                'regularChestCount': 'Regular',
+                'premiumChestCount': 'Premium',
+            }),
+            x_label='Date',
+            y_label='Number of Opens',
+            color=['#1f77b4', '#ff7f0e'],
+        )
 else:
-    st.warning("No DailyChestOpen entities found.")
\ No newline at end of file
+    st.warning("No DailyChestOpen entities found.")
+
+debug_panel()
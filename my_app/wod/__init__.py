@@ -0,0 +1,10 @@
+"""Shared helpers for the Chest Analysis app and the Sybil scripts.
+
+Modules read their settings (``SUBGRAPH_MAX_WORKERS``, ``WOD_STORE_PATH``,
+``WOD_VIEWS_DIR`` and the like) from the environment when they are imported,
+so a ``.env`` file is loaded here, before any of them. Variables that are
+already set take precedence.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
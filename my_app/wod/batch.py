@@ -0,0 +1,192 @@
+"""Batched per-user lookups using aliased GraphQL documents.
+
+Instead of one request per wallet, up to ``batch_size`` ``user(id:)`` or
+``chestOpeneds(where: {user: ...})`` selections are merged into one
+document under aliases (``u0``, ``u1``, ...), documents are sent
+concurrently with httpx's asyncio client, and the aliased results are split
+back out per wallet.
+
+    python -m wod.batch users flagged.txt > users.jsonl
+    python -m wod.batch chest-opens flagged.txt > chest_opens.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from . import metrics
+from .client import (DEFAULT_BACKOFF_FACTOR, DEFAULT_MAX_RETRIES, DEFAULT_TIMEOUT, RETRY_STATUS_CODES, QueryError,
+                     count_rows, operation_name)
+from .pagination import selects_id
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_CONCURRENCY = 8
+# Events per wallet per round; graph-node's maximum for ``first``
+DEFAULT_PAGE_SIZE = 1000
+
+USER_FIELDS = '''
+        id
+        lifetimeChestCount
+        lifetimePremiumChestCount
+        lifetimeTotalChestCount
+        isPremiumUser
+'''
+
+CHEST_OPEN_FIELDS = '''
+        id
+        timestamp
+        isPremium
+        blockNumber
+        logIndex
+'''
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def build_users_document(count, fields=USER_FIELDS):
+    """Return a document looking up ``count`` users by ``$id0``..``$id<count-1>``."""
+    params = ', '.join(f'$id{i}: ID!' for i in range(count))
+    selections = '\n'.join(f'    u{i}: user(id: $id{i}) {{{fields}    }}' for i in range(count))
+    return f'query BatchUsers({params}) {{\n{selections}\n}}'
+
+
+def build_chest_opens_document(count, fields=CHEST_OPEN_FIELDS):
+    """Return a document fetching one page of events for each of ``count`` users.
+
+    Each alias ``u<i>`` pages by id after ``$after<i>`` for user ``$user<i>``.
+    """
+    params = ', '.join(f'$user{i}: String!, $after{i}: String!' for i in range(count))
+    selections = '\n'.join(
+        f'    u{i}: chestOpeneds(first: $first, orderBy: id, orderDirection: asc, '
+        f'where: {{user: $user{i}, id_gt: $after{i}}}) {{{fields}    }}'
+        for i in range(count)
+    )
+    return f'query BatchChestOpens($first: Int!, {params}) {{\n{selections}\n}}'
+
+
+class BatchFetcher:
+    def __init__(self, url=None, batch_size=DEFAULT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY,
+                 timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR):
+        self.url = url or os.getenv('SUBGRAPH_URL')
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+
+    async def _post(self, http, semaphore, query, variables):
+        name = operation_name(query)
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                start = time.perf_counter()
+                try:
+                    response = await http.post(self.url, json={'query': query, 'variables': variables})
+                except Exception as e:
+                    metrics.record('query', name, time.perf_counter() - start, error=1)
+                    if attempt == self.max_retries:
+                        raise QueryError(f"Query failed: {e}") from e
+                else:
+                    seconds = time.perf_counter() - start
+                    if response.status_code == 200:
+                        start = time.perf_counter()
+                        result = response.json()
+                        metrics.record('query', name, seconds, decode_seconds=time.perf_counter() - start,
+                                       bytes=len(response.content), rows=count_rows(result), status=200)
+                        if result.get('errors'):
+                            raise QueryError(result['errors'][0].get('message', 'Query failed'))
+                        return result['data']
+                    metrics.record('query', name, seconds, bytes=len(response.content),
+                                   status=response.status_code, error=1)
+                    if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                        raise QueryError(f"Query failed with status code {response.status_code}")
+                await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+    async def _gather(self, requests):
+        import httpx
+
+        if not self.url:
+            raise QueryError("SUBGRAPH_URL is not set")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits) as http:
+            return await asyncio.gather(*(self._post(http, semaphore, query, variables) for query, variables in requests))
+
+    async def fetch_users_async(self, user_ids, fields=USER_FIELDS):
+        user_ids = list(dict.fromkeys(user_ids))
+        requests = []
+        for batch in _chunks(user_ids, self.batch_size):
+            variables = {f'id{i}': user_id for i, user_id in enumerate(batch)}
+            requests.append((build_users_document(len(batch), fields), variables))
+        results = await self._gather(requests)
+        users = {}
+        for batch, data in zip(_chunks(user_ids, self.batch_size), results):
+            for i, user_id in enumerate(batch):
+                users[user_id] = data[f'u{i}']
+        return users
+
+    async def fetch_chest_opens_async(self, user_ids, fields=CHEST_OPEN_FIELDS, first=DEFAULT_PAGE_SIZE):
+        """Return every event of each user; users with more than ``first`` events are paged in later rounds."""
+        if not selects_id(fields):
+            fields = f'\n        id{fields}'
+        events = {user_id: [] for user_id in dict.fromkeys(user_ids)}
+        cursors = {user_id: '' for user_id in events}
+        while cursors:
+            pending = list(cursors)
+            requests = []
+            for batch in _chunks(pending, self.batch_size):
+                variables = {'first': first}
+                for i, user_id in enumerate(batch):
+                    variables[f'user{i}'] = user_id
+                    variables[f'after{i}'] = cursors[user_id]
+                requests.append((build_chest_opens_document(len(batch), fields), variables))
+            results = await self._gather(requests)
+            cursors = {}
+            for batch, data in zip(_chunks(pending, self.batch_size), results):
+                for i, user_id in enumerate(batch):
+                    page = data[f'u{i}']
+                    events[user_id].extend(page)
+                    if len(page) == first:
+                        cursors[user_id] = page[-1]['id']
+        for rows in events.values():
+            if rows and 'timestamp' in rows[0]:
+                rows.sort(key=lambda row: int(row['timestamp']))
+        return events
+
+    def fetch_users(self, user_ids, fields=USER_FIELDS):
+        """Return ``{user_id: user or None}`` for every id."""
+        return asyncio.run(self.fetch_users_async(user_ids, fields))
+
+    def fetch_chest_opens(self, user_ids, fields=CHEST_OPEN_FIELDS, first=DEFAULT_PAGE_SIZE):
+        """Return ``{user_id: [events]}`` for every id, oldest first."""
+        return asyncio.run(self.fetch_chest_opens_async(user_ids, fields, first))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch subgraph data for many wallets in batched requests")
+    parser.add_argument('entity', choices=('users', 'chest-opens'))
+    parser.add_argument('addresses', help="file with one wallet address per line")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    # A full page keeps heavy wallets to one round; a smaller one bounds the size
+    # of each response (batch size x page size rows) if the indexer times out
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE,
+                        help="chest opens per wallet per request; wallets with more are paged in later rounds")
+    args = parser.parse_args()
+
+    with open(args.addresses) as f:
+        user_ids = [line.strip().lower() for line in f if line.strip()]
+    fetcher = BatchFetcher(batch_size=args.batch_size, concurrency=args.concurrency)
+    if args.entity == 'users':
+        results = fetcher.fetch_users(user_ids)
+    else:
+        results = fetcher.fetch_chest_opens(user_ids, first=args.page_size)
+    for user_id, value in results.items():
+        sys.stdout.write(json.dumps({'user': user_id, 'data': value}) + '\n')
+
+
+if __name__ == '__main__':
+    main()
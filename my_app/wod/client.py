@@ -0,0 +1,190 @@
+"""Shared GraphQL client for the DailyTreasureEvent subgraph.
+
+Every page and script goes through one pooled ``requests.Session`` so that
+queries reuse keep-alive connections instead of opening a new TLS connection
+each time. Rate limiting (429) and server errors (5xx) are retried with
+exponential backoff, and independent pages can be fetched concurrently. The
+shared client answers repeated and concurrent identical queries from one
+:class:`wod.response_cache.ResponseCache`.
+"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+from .response_cache import RESPONSE_TTL, ResponseCache
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_MAX_WORKERS = int(os.getenv('SUBGRAPH_MAX_WORKERS', '8'))
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def operation_name(query):
+    """Return a query's operation name, or its first root field for anonymous queries."""
+    match = re.search(r'\b(?:query|subscription)\s+(\w+)', query) or re.search(r'\{\s*(?:\w+\s*:\s*)?(\w+)', query)
+    return match.group(1) if match else 'query'
+
+
+def count_rows(result):
+    """Count the entities in a decoded response: list lengths for collections, one per single entity."""
+    data = (result or {}).get('data') or {}
+    return sum(len(value) if isinstance(value, list) else int(value is not None) for value in data.values())
+
+
+class QueryError(Exception):
+    """Raised when the subgraph cannot answer a query."""
+
+
+class SubgraphClient:
+    def __init__(self, url=None, timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR, max_workers=DEFAULT_MAX_WORKERS, cache=None):
+        self.url = url or os.getenv('SUBGRAPH_URL')
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.cache = cache
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(['POST']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        # One connection per worker so concurrent fetches never wait on the pool
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(max_workers, 1), max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _send(self, query, variables):
+        if not self.url:
+            raise QueryError("SUBGRAPH_URL is not set")
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.url, json={'query': query, 'variables': variables or {}},
+                                         timeout=self.timeout)
+        except requests.RequestException as e:
+            metrics.record('query', operation_name(query), time.perf_counter() - start, error=1)
+            raise QueryError(f"Query failed: {e}") from e
+        return response, time.perf_counter() - start
+
+    def post(self, query, variables=None):
+        """Send a query and return the raw HTTP response."""
+        response, seconds = self._send(query, variables)
+        metrics.record('query', operation_name(query), seconds, bytes=len(response.content),
+                       status=response.status_code)
+        return response
+
+    def _fetch(self, query, variables):
+        response, seconds = self._send(query, variables)
+        if response.status_code != 200:
+            metrics.record('query', operation_name(query), seconds, bytes=len(response.content),
+                           status=response.status_code, error=1)
+            raise QueryError(f"Query failed with status code {response.status_code}")
+        return response.content
+
+    def execute(self, query, variables=None):
+        """Send a query and return the decoded JSON body.
+
+        With a cache, a fresh or in-flight identical query is answered without
+        a request, and recorded as a ``cache`` measurement instead of a ``query``.
+        """
+        started = time.perf_counter()
+        if self.cache is None:
+            body, hit = self._fetch(query, variables), False
+        else:
+            body, hit = self.cache.get(query, variables, lambda: self._fetch(query, variables))
+        fetched = time.perf_counter()
+        result = json.loads(body)
+        seconds = fetched - started
+        fields = {'decode_seconds': time.perf_counter() - fetched, 'bytes': len(body), 'rows': count_rows(result)}
+        if hit:
+            metrics.record('cache', operation_name(query), seconds, **fields)
+        else:
+            metrics.record('query', operation_name(query), seconds, status=200, **fields)
+            if self.cache is not None and result.get('errors'):
+                # Errors such as an indexer that is behind are usually transient
+                self.cache.discard(query, variables)
+        return result
+
+    def execute_many(self, query, variables_list, max_workers=None):
+        """Run the same query for each set of variables concurrently, preserving order."""
+        variables_list = list(variables_list)
+        workers = min(max_workers or self.max_workers, len(variables_list))
+        if workers <= 1:
+            return [self.execute(query, variables) for variables in variables_list]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            tasks = [metrics.bind(self.execute) for _ in variables_list]
+            return list(executor.map(lambda task, variables: task(query, variables), tasks, variables_list))
+
+    def fetch_pages(self, query, entity, variables=None, first=1000, max_workers=None, max_rows=None):
+        """Fetch every row of ``entity`` using ``$first``/``$skip`` pages.
+
+        Pages are requested ``max_workers`` at a time; fetching stops at the
+        first short page. A page answered with GraphQL errors raises
+        :class:`QueryError` rather than ending the crawl early. graph-node
+        rejects ``skip`` above 5000, so large collections should go through
+        :mod:`wod.pagination` instead.
+        """
+        workers = max_workers or self.max_workers
+        rows = []
+        skip = 0
+        while max_rows is None or len(rows) < max_rows:
+            # Never ask for pages past max_rows, which may lie beyond the skip limit
+            n_pages = workers if max_rows is None else min(workers, -(-(max_rows - len(rows)) // first))
+            batch = [dict(variables or {}, first=first, skip=skip + i * first) for i in range(n_pages)]
+            skip += n_pages * first
+            done = False
+            for result in self.execute_many(query, batch, max_workers=workers):
+                if result.get('errors'):
+                    raise QueryError(result['errors'][0].get('message', 'Query failed'))
+                page = (result.get('data') or {}).get(entity) or []
+                rows.extend(page)
+                if len(page) < first:
+                    done = True
+                    break
+            if done:
+                break
+        return rows if max_rows is None else rows[:max_rows]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide client, creating it on first use.
+
+    Its response cache is shared by every page and session of the process;
+    ``WOD_RESPONSE_TTL=0`` turns it off.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SubgraphClient(cache=ResponseCache() if RESPONSE_TTL > 0 else None)
+        return _client
+
+
+def execute_query(query, variables=None, on_error=None):
+    """Run a query on the shared client.
+
+    Failures raise :class:`QueryError`, unless ``on_error`` is given, in which
+    case it is called with the error message and ``None`` is returned.
+    """
+    try:
+        return get_client().execute(query, variables)
+    except QueryError as e:
+        if on_error is None:
+            raise
+        on_error(str(e))
+        return None
@@ -0,0 +1,150 @@
+"""Clustering backends for the Sybil scan.
+
+Every backend takes the scaled feature matrix and returns one label per row
+(``-1`` for noise), so callers can switch between them freely:
+
+- ``dbscan``: exact sklearn DBSCAN with its default neighbour search
+- ``balltree`` / ``kdtree``: DBSCAN over a tree index, queried in parallel
+- ``hdbscan``: sklearn HDBSCAN, which needs no ``eps``
+- ``sampled``: DBSCAN on a random sample, remaining rows take the label of
+  the nearest core sample within ``eps``
+"""
+import hashlib
+import time
+import tracemalloc
+from collections import namedtuple
+from functools import partial
+
+import numpy as np
+
+METHODS = ('dbscan', 'balltree', 'kdtree', 'hdbscan', 'sampled')
+
+ClusterResult = namedtuple('ClusterResult', ['labels', 'seconds', 'peak_memory'])
+
+
+def file_hash(path):
+    """Return the SHA-256 of a feature file, used to key cached scans."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def fit_scaling(features):
+    """Fit mean imputation and standardisation on every column except ``user_id``.
+
+    Returns the fitted imputer and scaler together with the scaled matrix.
+    """
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import StandardScaler
+
+    X_numeric = features.drop(columns=['user_id'])
+    imputer = SimpleImputer(strategy='mean')
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(imputer.fit_transform(X_numeric))
+    return imputer, scaler, X_scaled
+
+
+def scale_features(features):
+    """Mean-impute and standardise every column except ``user_id``."""
+    return fit_scaling(features)[2]
+
+
+def _dbscan(X, eps, min_samples, algorithm='auto', n_jobs=None, metric='euclidean'):
+    from sklearn.cluster import DBSCAN
+
+    return DBSCAN(eps=eps, min_samples=min_samples, algorithm=algorithm, n_jobs=n_jobs,
+                  metric=metric).fit_predict(X)
+
+
+def _hdbscan(X, min_samples, n_jobs=None):
+    from sklearn.cluster import HDBSCAN
+
+    return HDBSCAN(min_cluster_size=max(min_samples, 2), min_samples=min_samples, n_jobs=n_jobs).fit_predict(X)
+
+
+def _sampled(X, eps, min_samples, n_jobs=None, sample_size=50000, random_state=0):
+    from sklearn.cluster import DBSCAN
+    from sklearn.neighbors import NearestNeighbors
+
+    if len(X) <= sample_size:
+        return _dbscan(X, eps, min_samples, algorithm='ball_tree', n_jobs=n_jobs)
+
+    rng = np.random.default_rng(random_state)
+    sample = rng.choice(len(X), size=sample_size, replace=False)
+    # Scale min_samples down with the sample so density thresholds stay comparable
+    sample_min = max(2, round(min_samples * sample_size / len(X)))
+    model = DBSCAN(eps=eps, min_samples=sample_min, algorithm='ball_tree', n_jobs=n_jobs).fit(X[sample])
+
+    labels = np.full(len(X), -1, dtype=np.int64)
+    labels[sample] = model.labels_
+    core = model.core_sample_indices_
+    if len(core) == 0:
+        return labels
+
+    rest = np.setdiff1d(np.arange(len(X)), sample)
+    index = NearestNeighbors(n_neighbors=1, algorithm='ball_tree', n_jobs=n_jobs).fit(X[sample][core])
+    distance, nearest = index.kneighbors(X[rest])
+    distance, nearest = distance[:, 0], nearest[:, 0]
+    labels[rest] = np.where(distance <= eps, model.labels_[core][nearest], -1)
+    return labels
+
+
+def _timed(func, *args, measure_memory=False, **kwargs):
+    """Call ``func`` and return its labels with runtime and peak traced memory in bytes.
+
+    The runtime comes from a plain call. tracemalloc slows allocation-heavy
+    backends down unevenly, so with ``measure_memory`` peak memory is taken
+    from a second, traced call; otherwise it is ``None``. tracemalloc only
+    counts allocations made through Python's allocator (numpy arrays
+    included), not memory that compiled code allocates directly, so the peak
+    is a lower bound.
+    """
+    start = time.perf_counter()
+    labels = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+
+    peak_memory = None
+    if measure_memory:
+        owns_trace = not tracemalloc.is_tracing()
+        if owns_trace:
+            tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            if owns_trace:
+                tracemalloc.stop()
+    return ClusterResult(np.asarray(labels), seconds, peak_memory)
+
+
+def cluster(X, method='dbscan', eps=0.5, min_samples=5, n_jobs=-1, measure_memory=False, **kwargs):
+    """Cluster the scaled matrix ``X`` with the chosen backend."""
+    if method not in METHODS:
+        raise ValueError(f"Unknown clustering method {method!r}, expected one of {METHODS}")
+
+    timed = partial(_timed, measure_memory=measure_memory)
+    if method == 'dbscan':
+        return timed(_dbscan, X, eps, min_samples)
+    if method == 'balltree':
+        return timed(_dbscan, X, eps, min_samples, algorithm='ball_tree', n_jobs=n_jobs)
+    if method == 'kdtree':
+        return timed(_dbscan, X, eps, min_samples, algorithm='kd_tree', n_jobs=n_jobs)
+    if method == 'hdbscan':
+        return timed(_hdbscan, X, min_samples, n_jobs=n_jobs)
+    return timed(_sampled, X, eps, min_samples, n_jobs=n_jobs, **kwargs)
+
+
+def neighbourhood_graph(X, radius, n_jobs=-1):
+    """Return the sparse distance graph of all pairs of rows closer than ``radius``.
+
+    DBSCAN over this graph gives the same labels as DBSCAN over ``X`` for any
+    ``eps <= radius``, so ``eps`` and ``min_samples`` can be retuned without
+    repeating the neighbour search.
+    """
+    from sklearn.neighbors import NearestNeighbors
+
+    return NearestNeighbors(radius=radius, n_jobs=n_jobs).fit(X).radius_neighbors_graph(X, mode='distance')
+
+
+def cluster_graph(graph, eps=0.5, min_samples=5, measure_memory=False):
+    """Run DBSCAN over a graph from :func:`neighbourhood_graph`."""
+    return _timed(_dbscan, graph, eps, min_samples, metric='precomputed', measure_memory=measure_memory)
@@ -0,0 +1,150 @@
+"""Cross-wallet timing correlation.
+
+Wallets driven by one script open chests in the same few seconds. Every
+event is put in a ``BUCKET_SECONDS`` time bucket and the wallets × buckets
+presence matrix ``B`` is kept sparse, so ``B @ B.T`` only ever produces the
+pairs of wallets that share at least one bucket, never all N² pairs. Pairs
+that share enough buckets relative to their activity (Jaccard similarity)
+form a graph whose connected components are the candidate Sybil rings.
+
+    python -m wod.cooccurrence [--bucket 10] [--edges timing_edges.csv] [--groups timing_groups.csv]
+"""
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+
+from . import store
+from .events import ChestOpens
+from .features import _user_codes
+
+BUCKET_SECONDS = 10
+# Buckets busier than this (peak minutes of a treasure event) say little about
+# any single pair and would dominate the number of pairs, so they are skipped
+MAX_BUCKET_WALLETS = 500
+# A pair must share this many buckets, and this fraction of their active buckets
+MIN_SHARED = 5
+MIN_JACCARD = 0.3
+
+TIMING_COLUMNS = ['correlated_wallets', 'max_timing_jaccard', 'timing_group_size']
+
+
+def bucket_matrix(events, bucket_seconds=BUCKET_SECONDS, max_bucket_wallets=MAX_BUCKET_WALLETS):
+    """Return the sparse wallets × buckets presence matrix and the wallet addresses of its rows.
+
+    ``events`` is a :class:`wod.events.ChestOpens` or a frame with ``user``
+    and ``timestamp`` columns; rows are in address order.
+    """
+    from scipy import sparse
+
+    codes, users = _user_codes(events)
+    if isinstance(events, ChestOpens):
+        timestamps = events.timestamps
+    else:
+        timestamps = events['timestamp'].to_numpy(dtype=np.int64)
+    buckets, uniques = pd.factorize(timestamps // bucket_seconds)
+
+    # Summing duplicates and clamping to one keeps one entry per wallet and bucket
+    B = sparse.csr_matrix((np.ones(len(codes), dtype=np.int32), (codes, buckets)),
+                          shape=(len(users), len(uniques)))
+    B.data[:] = 1
+    wallets = np.bincount(B.indices, minlength=B.shape[1])
+    B = B[:, np.flatnonzero(wallets <= max_bucket_wallets)]
+    return B, users
+
+
+def correlated_pairs(events, bucket_seconds=BUCKET_SECONDS, min_shared=MIN_SHARED, min_jaccard=MIN_JACCARD,
+                     max_bucket_wallets=MAX_BUCKET_WALLETS):
+    """Return the wallet pairs that open chests in the same buckets, most similar first.
+
+    Columns are ``user_a``, ``user_b`` (``user_a < user_b``), ``shared``
+    buckets and their ``jaccard`` similarity.
+    """
+    from scipy import sparse
+
+    B, users = bucket_matrix(events, bucket_seconds, max_bucket_wallets)
+    active = B.getnnz(axis=1)
+    shared = sparse.triu(B @ B.T, k=1).tocoo()
+    a, b, counts = shared.row, shared.col, shared.data
+    keep = counts >= min_shared
+    a, b, counts = a[keep], b[keep], counts[keep]
+    jaccard = counts / (active[a] + active[b] - counts)
+    keep = jaccard >= min_jaccard
+
+    pairs = pd.DataFrame({
+        'user_a': users[a[keep]],
+        'user_b': users[b[keep]],
+        'shared': counts[keep].astype(np.int64),
+        'jaccard': jaccard[keep],
+    })
+    return pairs.sort_values(['jaccard', 'shared', 'user_a', 'user_b'],
+                             ascending=[False, False, True, True], ignore_index=True)
+
+
+def timing_groups(pairs):
+    """Return the connected components of the pair graph as ``user_id``, ``group`` and ``group_size``.
+
+    Groups are numbered from the largest down; wallets without a pair are left out.
+    """
+    from scipy import sparse
+    from scipy.sparse.csgraph import connected_components
+
+    codes, users = pd.factorize(pd.concat([pairs['user_a'], pairs['user_b']]).to_numpy(), sort=True)
+    n_pairs = len(pairs)
+    graph = sparse.coo_matrix((np.ones(n_pairs), (codes[:n_pairs], codes[n_pairs:])), shape=(len(users), len(users)))
+    _, labels = connected_components(graph, directed=False)
+
+    sizes = np.bincount(labels)
+    # Largest groups first, ties broken by their smallest address
+    first_member = np.full(len(sizes), len(users))
+    np.minimum.at(first_member, labels, np.arange(len(users)))
+    rank = np.empty(len(sizes), dtype=np.int64)
+    rank[np.lexsort((first_member, -sizes))] = np.arange(len(sizes))
+    groups = pd.DataFrame({'user_id': users, 'group': rank[labels], 'group_size': sizes[labels]})
+    return groups.sort_values(['group', 'user_id'], ignore_index=True)
+
+
+def timing_features(pairs, user_ids):
+    """Return the per-wallet timing-correlation columns for ``user_ids``, to join onto the Sybil features.
+
+    - ``correlated_wallets``: number of wallets it forms a pair with
+    - ``max_timing_jaccard``: its highest pair similarity
+    - ``timing_group_size``: size of its connected group, 1 if it has no pair
+    """
+    both = pd.concat([
+        pairs[['user_a', 'jaccard']].rename(columns={'user_a': 'user_id'}),
+        pairs[['user_b', 'jaccard']].rename(columns={'user_b': 'user_id'}),
+    ])
+    per_user = both.groupby('user_id')['jaccard'].agg(['size', 'max'])
+    groups = timing_groups(pairs).set_index('user_id')['group_size']
+
+    index = pd.Index(user_ids, name='user_id')
+    return pd.DataFrame({
+        'correlated_wallets': per_user['size'].reindex(index, fill_value=0).astype(np.int64),
+        'max_timing_jaccard': per_user['max'].reindex(index, fill_value=0.0).astype(np.float64),
+        'timing_group_size': groups.reindex(index, fill_value=1).astype(np.int64),
+    }).reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find wallets that open chests in the same seconds")
+    parser.add_argument('--bucket', type=int, default=BUCKET_SECONDS, help="bucket width in seconds")
+    parser.add_argument('--min-shared', type=int, default=MIN_SHARED)
+    parser.add_argument('--min-jaccard', type=float, default=MIN_JACCARD)
+    parser.add_argument('--edges', default='timing_edges.csv', help="pair graph as an edge list")
+    parser.add_argument('--groups', default='timing_groups.csv', help="connected groups, largest first")
+    parser.add_argument('--path', default=store.DEFAULT_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    pairs = correlated_pairs(store.load_events(path=args.path), args.bucket, args.min_shared, args.min_jaccard)
+    groups = timing_groups(pairs)
+    pairs.to_csv(args.edges, index=False)
+    groups.to_csv(args.groups, index=False)
+    logging.info(f"Saved {len(pairs)} correlated pairs to {args.edges} and "
+                 f"{groups['group'].nunique()} groups to {args.groups}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""Streaming bot-burst detector.
+
+Tails new chest opens, either from the local store or straight from the
+subgraph with a block cursor, and keeps a small sliding-window state per
+wallet: opens in the last minute, the run of consecutive opens less than
+``BURST_SECONDS`` apart (the burst rule of :mod:`wod.features`) and the
+spread of the last ``INTERVAL_HISTORY`` intervals. Each event costs O(1)
+amortised work, wallets idle for ``IDLE_SECONDS`` are dropped, and at most
+``MAX_WALLETS`` are tracked, so memory stays bounded however long it runs.
+
+    python -m wod.detector [--source store|subgraph] [--poll 5]
+"""
+import argparse
+import json
+import logging
+import math
+import time
+from collections import OrderedDict, deque, namedtuple
+from contextlib import closing
+
+from . import store
+from .client import QueryError, SubgraphClient
+from .features import BURST_SECONDS
+from .pagination import iter_pages
+
+RATE_WINDOW = 60
+# Opens within RATE_WINDOW seconds that raise a `rate` alert
+RATE_THRESHOLD = 10
+# Consecutive sub-BURST_SECONDS intervals that raise a `burst` alert
+BURST_THRESHOLD = 5
+INTERVAL_HISTORY = 20
+# Coefficient of variation of the last INTERVAL_HISTORY intervals below which
+# a wallet opens too regularly to be a person
+REGULARITY_THRESHOLD = 0.05
+# Seconds before the same rule can fire again for the same wallet
+ALERT_COOLDOWN = 600
+IDLE_SECONDS = 86400
+MAX_WALLETS = 200000
+POLL_SECONDS = 5
+
+HEAD_QUERY = '''
+query chestOpenedHead {
+    rows: chestOpeneds(first: 1, orderBy: blockNumber, orderDirection: desc) {
+        blockNumber
+    }
+}
+'''
+
+Alert = namedtuple('Alert', ['user', 'rule', 'value', 'timestamp', 'blockNumber'])
+
+
+class WalletWindow:
+    __slots__ = ('recent', 'last', 'run', 'intervals', 'interval_sum', 'interval_sq', 'alerted')
+
+    def __init__(self):
+        self.recent = deque()
+        self.last = None
+        self.run = 0
+        self.intervals = deque()
+        self.interval_sum = 0.0
+        self.interval_sq = 0.0
+        self.alerted = {}
+
+    def add(self, timestamp):
+        """Fold one open into the window; every step is O(1) amortised."""
+        self.recent.append(timestamp)
+        while self.recent[0] <= timestamp - RATE_WINDOW:
+            self.recent.popleft()
+
+        if self.last is not None:
+            interval = max(timestamp - self.last, 0)
+            self.run = self.run + 1 if interval < BURST_SECONDS else 0
+            self.intervals.append(interval)
+            self.interval_sum += interval
+            self.interval_sq += interval * interval
+            if len(self.intervals) > INTERVAL_HISTORY:
+                evicted = self.intervals.popleft()
+                self.interval_sum -= evicted
+                self.interval_sq -= evicted * evicted
+        self.last = max(timestamp, self.last) if self.last is not None else timestamp
+
+    def regularity(self):
+        """Return the coefficient of variation of the recent intervals, or ``None`` until the history is full."""
+        if len(self.intervals) < INTERVAL_HISTORY or self.interval_sum <= 0:
+            return None
+        mean = self.interval_sum / len(self.intervals)
+        variance = max(self.interval_sq / len(self.intervals) - mean * mean, 0.0)
+        return math.sqrt(variance) / mean
+
+
+class BurstDetector:
+    def __init__(self, max_wallets=MAX_WALLETS, idle_seconds=IDLE_SECONDS):
+        """Track per-wallet windows, least recently active first."""
+        self.wallets = OrderedDict()
+        self.max_wallets = max_wallets
+        self.idle_seconds = idle_seconds
+        self.events = 0
+
+    def _evict(self, now):
+        while self.wallets:
+            user, window = next(iter(self.wallets.items()))
+            if len(self.wallets) <= self.max_wallets and window.last > now - self.idle_seconds:
+                break
+            del self.wallets[user]
+
+    def _fire(self, window, user, rule, value, timestamp, block):
+        if timestamp - window.alerted.get(rule, -ALERT_COOLDOWN) < ALERT_COOLDOWN:
+            return None
+        window.alerted[rule] = timestamp
+        return Alert(user, rule, value, timestamp, block)
+
+    def process(self, user, timestamp, block=None):
+        """Fold one chest open and return the alerts it raises."""
+        self.events += 1
+        window = self.wallets.pop(user, None) or WalletWindow()
+        self.wallets[user] = window
+        window.add(timestamp)
+        self._evict(timestamp)
+
+        alerts = []
+        if len(window.recent) >= RATE_THRESHOLD:
+            alerts.append(self._fire(window, user, 'rate', len(window.recent), timestamp, block))
+        if window.run >= BURST_THRESHOLD:
+            alerts.append(self._fire(window, user, 'burst', window.run, timestamp, block))
+        regularity = window.regularity()
+        if regularity is not None and regularity < REGULARITY_THRESHOLD:
+            alerts.append(self._fire(window, user, 'regular', round(regularity, 4), timestamp, block))
+        return [alert for alert in alerts if alert is not None]
+
+    def process_rows(self, rows):
+        """Fold ``(user, timestamp, blockNumber)`` rows in order and return every alert raised."""
+        alerts = []
+        for user, timestamp, block in rows:
+            alerts.extend(self.process(user, timestamp, block))
+        return alerts
+
+
+def tail_store(path=store.DEFAULT_PATH, start=None, poll_seconds=POLL_SECONDS, chunksize=10000):
+    """Yield lists of new ``(user, timestamp, blockNumber)`` rows from the local store, forever.
+
+    Starts after the newest stored event unless ``start`` gives a
+    ``(blockNumber, logIndex)`` to resume from.
+    """
+    with closing(store.connect(path)) as conn:
+        if start is None:
+            start = conn.execute('''
+                SELECT blockNumber, logIndex FROM chest_openeds ORDER BY blockNumber DESC, logIndex DESC LIMIT 1
+            ''').fetchone() or (-1, -1)
+        block, log_index = start
+        while True:
+            rows = conn.execute('''
+                SELECT user, timestamp, blockNumber, logIndex FROM chest_openeds
+                WHERE blockNumber > ? OR (blockNumber = ? AND logIndex > ?)
+                ORDER BY blockNumber, logIndex LIMIT ?
+            ''', (block, block, log_index, chunksize)).fetchall()
+            if rows:
+                block, log_index = rows[-1][2], rows[-1][3]
+                yield [row[:3] for row in rows]
+            if len(rows) < chunksize:
+                time.sleep(poll_seconds)
+
+
+def _head_block(client):
+    result = client.execute(HEAD_QUERY)
+    if result.get('errors'):
+        raise QueryError(result['errors'][0].get('message', 'Query failed'))
+    rows = result['data']['rows']
+    return int(rows[0]['blockNumber']) if rows else 0
+
+
+def tail_subgraph(start_block=None, poll_seconds=POLL_SECONDS, client=None):
+    """Yield lists of new ``(user, timestamp, blockNumber)`` rows polled from the subgraph, forever.
+
+    Each poll pages from the last block seen (inclusive), so events already
+    returned for that block are skipped by id. The default client has no
+    response cache, so every poll sees the latest indexed block.
+    """
+    client = client or SubgraphClient()
+    block = start_block if start_block is not None else _head_block(client)
+    seen = set()
+    while True:
+        for page in iter_pages('chestOpeneds', store.CHEST_OPENED_FIELDS, cursor='blockNumber', start=block,
+                               client=client):
+            page = [row for row in page if row['id'] not in seen]
+            if not page:
+                continue
+            page.sort(key=lambda row: (int(row['blockNumber']), int(row['logIndex'])))
+            last = int(page[-1]['blockNumber'])
+            if last != block:
+                seen = set()
+                block = last
+            seen.update(row['id'] for row in page if int(row['blockNumber']) == block)
+            yield [(row['user']['id'], int(row['timestamp']), int(row['blockNumber'])) for row in page]
+        time.sleep(poll_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raise alerts for bot-like chest-open bursts as events arrive")
+    parser.add_argument('--source', choices=('store', 'subgraph'), default='store',
+                        help="tail the local store (kept fresh by a separate sync) or poll the subgraph")
+    parser.add_argument('--path', default=store.DEFAULT_PATH)
+    parser.add_argument('--start-block', type=int, default=None, help="replay from this block instead of the head")
+    parser.add_argument('--poll', type=float, default=POLL_SECONDS, help="seconds between polls once caught up")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.source == 'store':
+        start = (args.start_block - 1, -1) if args.start_block is not None else None
+        batches = tail_store(args.path, start=start, poll_seconds=args.poll)
+    else:
+        batches = tail_subgraph(args.start_block, poll_seconds=args.poll)
+
+    detector = BurstDetector()
+    for rows in batches:
+        for alert in detector.process_rows(rows):
+            # One JSON object per alert on stdout, for piping into a notifier
+            print(json.dumps(alert._asdict()), flush=True)
+        logging.debug(f"{detector.events} events, {len(detector.wallets)} wallets tracked")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Compact chest-open events.
+
+Events are held as one NumPy structured array of ``(timestamp, user,
+isPremium)`` records, 13 bytes each, where ``user`` indexes an
+:class:`AddressTable` that stores every wallet address once. Subgraph pages
+and store frames are converted into records as they arrive, so a month of
+events costs tens of MB instead of a Python dict per event.
+"""
+import numpy as np
+import pandas as pd
+
+EVENT_DTYPE = np.dtype([('timestamp', np.int64), ('user', np.uint32), ('isPremium', np.bool_)])
+
+
+class AddressTable:
+    def __init__(self, addresses=()):
+        """Map wallet addresses to dense ``uint32`` indices, in order of first appearance."""
+        self._index = {}
+        self._addresses = []
+        self._array = None
+        self.intern(list(addresses))
+
+    def intern(self, addresses):
+        """Return the index of each address, adding the ones not seen before."""
+        codes, uniques = pd.factorize(np.asarray(addresses, dtype=object))
+        indices = np.empty(len(uniques), dtype=np.uint32)
+        for i, address in enumerate(uniques):
+            index = self._index.get(address)
+            if index is None:
+                index = self._index[address] = len(self._addresses)
+                self._addresses.append(address)
+                self._array = None
+            indices[i] = index
+        return indices[codes]
+
+    def index(self, address):
+        """Return the index of ``address``, or ``None`` if it was never interned."""
+        return self._index.get(address)
+
+    def lookup(self, indices):
+        """Return the addresses of ``indices`` as an object array."""
+        if self._array is None:
+            self._array = np.asarray(self._addresses, dtype=object)
+        return self._array[np.asarray(indices, dtype=np.intp)]
+
+    def __len__(self):
+        return len(self._addresses)
+
+
+class ChestOpens:
+    def __init__(self, records=None, addresses=None):
+        """Wrap ``EVENT_DTYPE`` records whose ``user`` field indexes ``addresses``."""
+        self.addresses = addresses if addresses is not None else AddressTable()
+        self._chunks = [records] if records is not None and len(records) else []
+        self._records = None
+
+    @classmethod
+    def from_pages(cls, pages, addresses=None):
+        """Build from pages of subgraph rows with ``timestamp``, ``isPremium`` and ``user { id }``."""
+        events = cls(addresses=addresses)
+        for page in pages:
+            events.add_page(page)
+        return events
+
+    @classmethod
+    def from_frames(cls, frames, addresses=None):
+        """Build from frames with ``user``, ``timestamp`` and ``isPremium`` columns, such as store chunks."""
+        events = cls(addresses=addresses)
+        for frame in frames:
+            events.add_frame(frame)
+        return events
+
+    def add(self, timestamps, user_ids, is_premium):
+        """Append events given as parallel arrays of unix timestamps, addresses and premium flags."""
+        records = np.empty(len(timestamps), dtype=EVENT_DTYPE)
+        records['timestamp'] = timestamps
+        records['user'] = self.addresses.intern(user_ids)
+        records['isPremium'] = is_premium
+        if len(records):
+            self._chunks.append(records)
+            self._records = None
+
+    def add_page(self, page):
+        """Append one page of ``chestOpeneds`` rows as returned by the subgraph."""
+        count = len(page)
+        self.add(np.fromiter((int(row['timestamp']) for row in page), dtype=np.int64, count=count),
+                 [row['user']['id'] for row in page],
+                 np.fromiter((row['isPremium'] for row in page), dtype=bool, count=count))
+
+    def add_frame(self, df):
+        self.add(df['timestamp'].to_numpy(dtype=np.int64), df['user'].to_numpy(), df['isPremium'].to_numpy(dtype=bool))
+
+    @property
+    def records(self):
+        if self._records is None:
+            self._records = np.concatenate(self._chunks) if self._chunks else np.empty(0, dtype=EVENT_DTYPE)
+            self._chunks = [self._records] if len(self._records) else []
+        return self._records
+
+    @property
+    def timestamps(self):
+        return self.records['timestamp']
+
+    @property
+    def users(self):
+        return self.records['user']
+
+    @property
+    def premium(self):
+        return self.records['isPremium']
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self._chunks)
+
+    def select(self, mask):
+        """Return the events where ``mask`` is true, sharing this address table."""
+        return ChestOpens(self.records[mask], self.addresses)
+
+    def between(self, start=None, end=None):
+        """Return the events with timestamps in ``[start, end]``."""
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self.timestamps >= start
+        if end is not None:
+            mask &= self.timestamps <= end
+        return self.select(mask)
+
+    def for_user(self, address):
+        index = self.addresses.index(address)
+        if index is None:
+            return ChestOpens(addresses=self.addresses)
+        return self.select(self.users == index)
+
+    def user_ids(self):
+        """Return the address of every event as an object array."""
+        return self.addresses.lookup(self.users)
+
+    def to_frame(self):
+        """Return a frame with the store's ``user``, ``timestamp`` and ``isPremium`` columns."""
+        return pd.DataFrame({'user': self.user_ids(), 'timestamp': self.timestamps, 'isPremium': self.premium})
@@ -0,0 +1,131 @@
+"""Out-of-core Sybil feature matrix.
+
+Features are written as ``.npy`` files that are memory-mapped on load: a
+``float64`` matrix with one column per :data:`wod.features.FEATURE_COLUMNS`
+(plus any extra feature columns) and a matching array of addresses. Mean
+imputation and standardisation statistics are accumulated in a single
+streaming pass, scaling is written chunk by chunk to another memory-mapped
+file and the 2-D projection comes from ``IncrementalPCA``, so no step holds
+more than one chunk of rows besides the output labels and projection.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .features import FEATURE_COLUMNS
+
+# Rows read, scaled or projected at a time
+CHUNK_SIZE = 100000
+# Wallet addresses are 0x-prefixed 20-byte hex strings
+ADDRESS_DTYPE = 'S42'
+
+Scaling = namedtuple('Scaling', ['mean', 'scale', 'count'])
+
+
+def ids_path(path):
+    """Return the path of the address array stored next to the matrix at ``path``."""
+    return path[:-len('.npy')] + '_ids.npy' if path.endswith('.npy') else path + '_ids.npy'
+
+
+def _chunks(n_rows, chunksize=CHUNK_SIZE, minimum=1):
+    """Yield row slices of ``chunksize``, merging a last chunk shorter than ``minimum`` into the previous one."""
+    stops = list(range(chunksize, n_rows, chunksize)) + [n_rows]
+    if len(stops) > 1 and stops[-1] - stops[-2] < minimum:
+        del stops[-2]
+    start = 0
+    for stop in stops:
+        if stop > start:
+            yield slice(start, stop)
+        start = stop
+
+
+def write_matrix(frames, path, n_rows, columns=FEATURE_COLUMNS):
+    """Write feature frames (as yielded by :func:`wod.feature_store.iter_features`) to ``path``.
+
+    ``n_rows`` is the total number of rows, which fixes the size of the
+    memory-mapped files up front; ``columns`` are stored in order. Returns
+    the number of rows written.
+    """
+    from numpy.lib.format import open_memmap
+
+    X = open_memmap(path, mode='w+', dtype=np.float64, shape=(n_rows, len(columns)))
+    ids = open_memmap(ids_path(path), mode='w+', dtype=ADDRESS_DTYPE, shape=(n_rows,))
+    written = 0
+    for frame in frames:
+        stop = written + len(frame)
+        X[written:stop] = frame[columns].to_numpy(dtype=np.float64)
+        ids[written:stop] = frame['user_id'].to_numpy(dtype=ADDRESS_DTYPE)
+        written = stop
+    if written != n_rows:
+        raise ValueError(f"Expected {n_rows} feature rows, got {written}")
+    X.flush()
+    ids.flush()
+    return written
+
+
+def open_matrix(path):
+    """Return the addresses and the read-only memory-mapped feature matrix stored at ``path``."""
+    return np.load(ids_path(path), mmap_mode='r'), np.load(path, mmap_mode='r')
+
+
+def fit_scaling(X, chunksize=CHUNK_SIZE):
+    """Accumulate mean imputation and standardisation statistics over ``X`` in one pass.
+
+    Matches ``SimpleImputer(strategy='mean')`` followed by ``StandardScaler``:
+    missing values are left out of the mean, and count as the mean (adding
+    nothing to the variance) once imputed. Per-chunk moments are merged with
+    Chan's parallel update, so large matrices lose no precision.
+    """
+    n_columns = X.shape[1]
+    count = np.zeros(n_columns)
+    mean = np.zeros(n_columns)
+    m2 = np.zeros(n_columns)
+    for rows in _chunks(len(X), chunksize):
+        chunk = np.asarray(X[rows], dtype=np.float64)
+        present = ~np.isnan(chunk)
+        chunk_count = present.sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            chunk_mean = np.where(chunk_count > 0, np.nansum(chunk, axis=0) / chunk_count, 0.0)
+        chunk_m2 = np.nansum((chunk - chunk_mean) ** 2, axis=0)
+
+        total = count + chunk_count
+        with np.errstate(invalid='ignore'):
+            delta = chunk_mean - mean
+            mean = np.where(total > 0, mean + delta * chunk_count / total, 0.0)
+            m2 = np.where(total > 0, m2 + chunk_m2 + delta ** 2 * count * chunk_count / total, 0.0)
+        count = total
+
+    scale = np.sqrt(m2 / len(X)) if len(X) else np.ones(n_columns)
+    # Constant columns are left unscaled, as StandardScaler does
+    scale[scale == 0] = 1.0
+    return Scaling(mean, scale, len(X))
+
+
+def scale(X, scaling, path=None, chunksize=CHUNK_SIZE):
+    """Impute and standardise ``X`` chunk by chunk, into a memory-mapped file at ``path`` if given."""
+    if path is None:
+        out = np.empty(X.shape, dtype=np.float64)
+    else:
+        from numpy.lib.format import open_memmap
+
+        out = open_memmap(path, mode='w+', dtype=np.float64, shape=X.shape)
+    for rows in _chunks(len(X), chunksize):
+        chunk = np.asarray(X[rows], dtype=np.float64)
+        chunk = np.where(np.isnan(chunk), scaling.mean, chunk)
+        out[rows] = (chunk - scaling.mean) / scaling.scale
+    if path is not None:
+        out.flush()
+    return out
+
+
+def project(X, n_components=2, chunksize=CHUNK_SIZE):
+    """Fit ``IncrementalPCA`` over ``X`` chunk by chunk and return the projection and the fitted model."""
+    from sklearn.decomposition import IncrementalPCA
+
+    pca = IncrementalPCA(n_components=n_components)
+    for rows in _chunks(len(X), chunksize, minimum=n_components):
+        pca.partial_fit(X[rows])
+    projection = np.empty((len(X), n_components), dtype=np.float64)
+    for rows in _chunks(len(X), chunksize):
+        projection[rows] = pca.transform(X[rows])
+    return projection, pca
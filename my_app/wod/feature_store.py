@@ -0,0 +1,247 @@
+"""Incrementally maintained Sybil features.
+
+Per-user running state (counts, first and last open, short intervals and a
+per-day histogram) lives next to the events in the local store and is
+advanced from a ``(blockNumber, logIndex)`` checkpoint, so a refresh only
+reads events newer than the previous one and only recomputes the entropy of
+users who had new opens. :func:`load_features` returns the same table as
+:func:`wod.features.extract_features` over the full history.
+
+    python -m wod.feature_store update [--rebuild]
+"""
+import argparse
+import logging
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from . import store
+from .features import BURST_SECONDS, SECONDS_PER_DAY, _entropy
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS feature_state (
+    user TEXT PRIMARY KEY,
+    regularCount INTEGER NOT NULL,
+    premiumCount INTEGER NOT NULL,
+    firstTimestamp INTEGER NOT NULL,
+    lastTimestamp INTEGER NOT NULL,
+    burstCount INTEGER NOT NULL,
+    dailyEntropy REAL
+);
+
+CREATE TABLE IF NOT EXISTS feature_days (
+    user TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS feature_checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    blockNumber INTEGER NOT NULL,
+    logIndex INTEGER NOT NULL
+);
+'''
+
+# Events folded in per transaction
+CHUNK_SIZE = 100000
+# Users per `IN (...)` lookup, below SQLite's default host parameter limit
+QUERY_BATCH_SIZE = 500
+
+
+def connect(path=store.DEFAULT_PATH):
+    conn = store.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def checkpoint(conn):
+    """Return the ``(blockNumber, logIndex)`` of the last folded event, or ``(-1, -1)``."""
+    row = conn.execute('SELECT blockNumber, logIndex FROM feature_checkpoint WHERE id = 0').fetchone()
+    return tuple(row) if row else (-1, -1)
+
+
+def _batches(items, size=QUERY_BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _load_state(conn, users):
+    frames = []
+    for batch in _batches(users):
+        sql = f"SELECT * FROM feature_state WHERE user IN ({', '.join('?' * len(batch))})"
+        frames.append(pd.read_sql_query(sql, conn, params=batch))
+    state = pd.concat(frames) if frames else pd.DataFrame(columns=['user'])
+    return state.set_index('user').reindex(users)
+
+
+def _fold(conn, events):
+    """Fold one chunk of events, ordered by block and log index, into the stored state."""
+    codes, users = pd.factorize(events['user'].to_numpy(), sort=True)
+    timestamps = events['timestamp'].to_numpy(dtype=np.int64)
+    premium = events['isPremium'].to_numpy(dtype=bool)
+
+    order = np.lexsort((timestamps, codes))
+    codes, timestamps, premium = codes[order], timestamps[order], premium[order]
+    n_users = len(users)
+
+    counts = np.bincount(codes, minlength=n_users)
+    premium_counts = np.bincount(codes[premium], minlength=n_users)
+    starts = np.cumsum(counts) - counts
+    first, last = timestamps[starts], timestamps[starts + counts - 1]
+
+    same_user = codes[1:] == codes[:-1]
+    is_burst = same_user & (np.diff(timestamps) < BURST_SECONDS)
+    bursts = np.bincount(codes[1:][is_burst], minlength=n_users)
+
+    days = timestamps // SECONDS_PER_DAY
+    day_start = np.ones(len(codes), dtype=bool)
+    day_start[1:] = ~same_user | (days[1:] != days[:-1])
+    day_index = np.flatnonzero(day_start)
+    day_counts = np.diff(np.append(day_index, len(codes)))
+
+    # The interval between a user's last stored open and their first new one
+    previous = _load_state(conn, users.tolist())
+    known = previous['lastTimestamp'].notna().to_numpy()
+    prev_last = previous['lastTimestamp'].fillna(0).to_numpy(dtype=np.int64)
+    bursts += known & (first - prev_last < BURST_SECONDS)
+
+    regular = counts - premium_counts + previous['regularCount'].fillna(0).to_numpy(dtype=np.int64)
+    premium_total = premium_counts + previous['premiumCount'].fillna(0).to_numpy(dtype=np.int64)
+    first = np.where(known, previous['firstTimestamp'].fillna(0).to_numpy(dtype=np.int64), first)
+    last = np.maximum(last, prev_last)
+    bursts += previous['burstCount'].fillna(0).to_numpy(dtype=np.int64)
+
+    state_rows = zip(users.tolist(), regular.tolist(), premium_total.tolist(),
+                     first.tolist(), last.tolist(), bursts.tolist())
+    day_rows = zip(users[codes[day_index]].tolist(), days[day_index].tolist(), day_counts.tolist())
+    tail = events.iloc[-1]
+    with conn:
+        # Entropy is left NULL until :func:`_refresh_entropy` recomputes it
+        conn.executemany('INSERT OR REPLACE INTO feature_state VALUES (?, ?, ?, ?, ?, ?, NULL)', state_rows)
+        conn.executemany('''
+            INSERT INTO feature_days VALUES (?, ?, ?)
+            ON CONFLICT (user, day) DO UPDATE SET count = count + excluded.count
+        ''', day_rows)
+        conn.execute('INSERT OR REPLACE INTO feature_checkpoint VALUES (0, ?, ?)',
+                     (int(tail['blockNumber']), int(tail['logIndex'])))
+    return n_users
+
+
+def _refresh_entropy(conn):
+    dirty = [row[0] for row in conn.execute('SELECT user FROM feature_state WHERE dailyEntropy IS NULL')]
+    for batch in _batches(dirty):
+        sql = f"SELECT user, count FROM feature_days WHERE user IN ({', '.join('?' * len(batch))})"
+        days = pd.read_sql_query(sql, conn, params=batch)
+        codes, users = pd.factorize(days['user'].to_numpy())
+        day_counts = days['count'].to_numpy(dtype=np.int64)
+        counts = np.bincount(codes, weights=day_counts, minlength=len(users)).astype(np.int64)
+        entropy = _entropy(codes, day_counts, counts, len(users))
+        with conn:
+            conn.executemany('UPDATE feature_state SET dailyEntropy = ? WHERE user = ?',
+                             zip(entropy.tolist(), users.tolist()))
+    return len(dirty)
+
+
+def update(path=store.DEFAULT_PATH, rebuild=False, chunksize=CHUNK_SIZE):
+    """Fold every stored event newer than the checkpoint into the feature state.
+
+    Returns the number of events read and of users whose features changed.
+    """
+    with closing(connect(path)) as conn:
+        if rebuild:
+            with conn:
+                conn.executescript('DELETE FROM feature_state; DELETE FROM feature_days; DELETE FROM feature_checkpoint;')
+        n_events = 0
+        while True:
+            block, log_index = checkpoint(conn)
+            events = pd.read_sql_query('''
+                SELECT user, timestamp, isPremium, blockNumber, logIndex FROM chest_openeds
+                WHERE blockNumber > ? OR (blockNumber = ? AND logIndex > ?)
+                ORDER BY blockNumber, logIndex LIMIT ?
+            ''', conn, params=(block, block, log_index, chunksize))
+            if events.empty:
+                break
+            _fold(conn, events)
+            n_events += len(events)
+        n_users = _refresh_entropy(conn)
+    logging.info(f"Folded {n_events} chest opens into the features of {n_users} users")
+    return {'events': n_events, 'users': n_users}
+
+
+def _feature_frame(state):
+    counts = (state['regularCount'] + state['premiumCount']).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_interval = np.where(counts > 1, (state['lastTimestamp'] - state['firstTimestamp']) / (counts - 1), np.nan)
+    return pd.DataFrame({
+        'user_id': state['user'],
+        'total_chests': state['regularCount'],
+        'premium_chests': state['premiumCount'],
+        'avg_time_interval': avg_interval,
+        'burst_count': np.where(counts > 2, state['burstCount'], 0),
+        'daily_entropy': state['dailyEntropy'].astype(np.float64),
+    })
+
+
+def load_features(user_ids=None, path=store.DEFAULT_PATH):
+    """Return the feature table of :func:`wod.features.extract_features` from the stored state."""
+    with closing(connect(path)) as conn:
+        state = pd.read_sql_query('SELECT * FROM feature_state ORDER BY user', conn)
+    features = _feature_frame(state)
+    if user_ids is not None:
+        features = (
+            features.set_index('user_id')
+            .reindex(pd.Index(user_ids, name='user_id'))
+            .fillna({'total_chests': 0, 'premium_chests': 0, 'burst_count': 0, 'daily_entropy': 0.0})
+            .astype({'total_chests': np.int64, 'premium_chests': np.int64, 'burst_count': np.int64})
+            .reset_index()
+        )
+    return features
+
+
+def count_users(path=store.DEFAULT_PATH):
+    with closing(connect(path)) as conn:
+        return conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+
+def iter_features(chunksize=CHUNK_SIZE, path=store.DEFAULT_PATH):
+    """Yield the features of every stored user in ``chunksize`` frames, ordered by address.
+
+    Each frame matches ``load_features(user_ids=...)`` for its users, so the
+    whole table is never held in memory at once.
+    """
+    with closing(connect(path)) as conn:
+        after = ''
+        while True:
+            state = pd.read_sql_query('''
+                SELECT u.id AS user,
+                       COALESCE(s.regularCount, 0) AS regularCount,
+                       COALESCE(s.premiumCount, 0) AS premiumCount,
+                       s.firstTimestamp, s.lastTimestamp,
+                       COALESCE(s.burstCount, 0) AS burstCount,
+                       COALESCE(s.dailyEntropy, 0.0) AS dailyEntropy
+                FROM users u LEFT JOIN feature_state s ON s.user = u.id
+                WHERE u.id > ? ORDER BY u.id LIMIT ?
+            ''', conn, params=(after, chunksize))
+            if state.empty:
+                break
+            yield _feature_frame(state)
+            after = state['user'].iloc[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the stored Sybil features from new chest opens")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    update_parser = subparsers.add_parser('update', help="fold events newer than the checkpoint")
+    update_parser.add_argument('--rebuild', action='store_true', help="discard the state and fold every event again")
+    update_parser.add_argument('--path', default=store.DEFAULT_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'update':
+        update(args.path, rebuild=args.rebuild)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Day x hour heatmaps built from a stream of chest-open pages.
+
+Pages are folded into a fixed ``(days, 24, 2)`` count array as they arrive,
+so memory depends on the date range rather than on how many chests a
+wallet opened. The most recent opens are kept in a bounded ring buffer.
+"""
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from .events import ChestOpens
+
+SECONDS_PER_DAY = 86400
+SECONDS_PER_HOUR = 3600
+
+
+class HeatmapBuilder:
+    def __init__(self, start, end, recent=100):
+        """Count opens with timestamps in ``[start, end]``, keeping the last ``recent`` of them."""
+        self.start = int(start)
+        self.end = int(end)
+        self.first_day = self.start // SECONDS_PER_DAY
+        n_days = self.end // SECONDS_PER_DAY - self.first_day + 1
+        self.counts = np.zeros((n_days, 24, 2), dtype=np.int64)
+        self.recent = deque(maxlen=recent)
+        self.total = 0
+
+    def add(self, timestamps, is_premium):
+        """Add arrays of unix timestamps and premium flags."""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        is_premium = np.asarray(is_premium, dtype=bool)
+        keep = (timestamps >= self.start) & (timestamps <= self.end)
+        timestamps, is_premium = timestamps[keep], is_premium[keep]
+        if not len(timestamps):
+            return
+
+        day = timestamps // SECONDS_PER_DAY - self.first_day
+        hour = timestamps % SECONDS_PER_DAY // SECONDS_PER_HOUR
+        np.add.at(self.counts, (day, hour, is_premium.astype(np.intp)), 1)
+        self.total += len(timestamps)
+
+        tail = slice(-self.recent.maxlen, None) if self.recent.maxlen else slice(0, 0)
+        self.recent.extend(zip(timestamps[tail].tolist(), is_premium[tail].tolist()))
+
+    def add_page(self, page):
+        """Add one page of ``chestOpeneds`` rows as returned by the subgraph."""
+        timestamps = np.fromiter((int(row['timestamp']) for row in page), dtype=np.int64, count=len(page))
+        is_premium = np.fromiter((row['isPremium'] for row in page), dtype=bool, count=len(page))
+        self.add(timestamps, is_premium)
+
+    def add_frame(self, df):
+        """Add a frame with ``timestamp`` and ``isPremium`` columns."""
+        self.add(df['timestamp'].to_numpy(), df['isPremium'].to_numpy())
+
+    def add_events(self, events):
+        """Add a :class:`wod.events.ChestOpens`."""
+        self.add(events.timestamps, events.premium)
+
+    def consume(self, pages):
+        """Add every page (lists of rows, frames or ``ChestOpens``) from an iterable and return ``self``."""
+        for page in pages:
+            if isinstance(page, pd.DataFrame):
+                self.add_frame(page)
+            elif isinstance(page, ChestOpens):
+                self.add_events(page)
+            else:
+                self.add_page(page)
+        return self
+
+    def frame(self, is_premium):
+        """Return a date x hour frame for one chest type, trimmed to the days with any opens."""
+        active = np.flatnonzero(self.counts.sum(axis=(1, 2)))
+        if not len(active):
+            return pd.DataFrame(columns=range(24))
+        days = slice(active[0], active[-1] + 1)
+        dates = pd.to_datetime((self.first_day + np.arange(days.start, days.stop)) * SECONDS_PER_DAY, unit='s')
+        return pd.DataFrame(self.counts[days, :, int(is_premium)], index=dates, columns=range(24))
+
+    def recent_frame(self):
+        """Return the buffered most recent opens, newest first."""
+        df = pd.DataFrame(list(self.recent), columns=['timestamp', 'isPremium'])
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+        return df.iloc[::-1].reset_index(drop=True)
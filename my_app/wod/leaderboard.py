@@ -0,0 +1,94 @@
+"""Windowed chest leaderboards.
+
+Counts are per user within the selected window, either aggregated by the
+local store or accumulated from the paginated event stream, and only the
+requested top rows are ever sorted.
+"""
+import numpy as np
+import pandas as pd
+
+from . import store
+from .events import ChestOpens
+from .pagination import iter_pages
+from .response_cache import round_timestamp
+
+COUNT_COLUMNS = ['regularChestCount', 'premiumChestCount', 'totalChestCount']
+
+WINDOW_EVENT_FIELDS = '''
+        timestamp
+        isPremium
+        user { id }
+'''
+
+
+def window_counts(events):
+    """Count a :class:`wod.events.ChestOpens` per user, ordered by address."""
+    n_users = len(events.addresses)
+    premium = np.bincount(events.users[events.premium], minlength=n_users)
+    total = np.bincount(events.users, minlength=n_users)
+    present = np.flatnonzero(total)
+    df = pd.DataFrame({
+        'id': events.addresses.lookup(present),
+        'regularChestCount': total[present] - premium[present],
+        'premiumChestCount': premium[present],
+        'totalChestCount': total[present],
+    })
+    return df.sort_values('id', ignore_index=True)
+
+
+def window_counts_from_pages(pages):
+    """Accumulate per-user counts from pages of ``chestOpeneds`` rows without keeping the rows."""
+    return window_counts(ChestOpens.from_pages(pages))
+
+
+def window_counts_from_subgraph(start, end=None, client=None):
+    """Stream the window's events from the subgraph and count them per user.
+
+    The window bounds are rounded down to the minute so that sessions asking
+    for the same window share cached pages.
+    """
+    start = round_timestamp(start)
+    end = round_timestamp(end) if end is not None else None
+    where = {'timestamp_lte': end} if end is not None else None
+    pages = iter_pages('chestOpeneds', WINDOW_EVENT_FIELDS, where=where, cursor='timestamp', start=start, client=client)
+    return window_counts_from_pages(pages)
+
+
+def top_n(counts, by='totalChestCount', n=100):
+    """Return the ``n`` rows with the largest ``by``, highest first and ties broken by id.
+
+    The cut-off value is found with a partial sort, so only the selected rows
+    are fully sorted.
+    """
+    if n <= 0 or counts.empty:
+        return counts.iloc[:0]
+    values = counts[by].to_numpy()
+    if n < len(values):
+        threshold = np.partition(values, len(values) - n)[len(values) - n]
+        above = np.flatnonzero(values > threshold)
+        ties = np.flatnonzero(values == threshold)
+        ties = ties[np.argsort(counts['id'].to_numpy()[ties], kind='stable')][:n - len(above)]
+        counts = counts.iloc[np.concatenate([above, ties])]
+    return counts.sort_values([by, 'id'], ascending=[False, True], kind='stable')
+
+
+def leaderboard(start, end=None, chest_type=None, by='totalChestCount', n=100,
+                premium_users_only=False, path=store.DEFAULT_PATH):
+    """Top ``n`` users by opens within ``[start, end]`` from the local store.
+
+    ``chest_type`` set to ``'premium'`` or ``'regular'`` keeps only users who
+    opened at least one chest of that type in the window.
+    """
+    counts = store.window_counts(start, end, path=path)
+    return top_n(filter_counts(counts, chest_type, premium_users_only), by=by, n=n)
+
+
+def filter_counts(counts, chest_type=None, premium_users_only=False):
+    """Keep the users of :func:`wod.store.window_counts` rows matching the leaderboard filters."""
+    if chest_type == 'premium':
+        counts = counts[counts['premiumChestCount'] > 0]
+    elif chest_type == 'regular':
+        counts = counts[counts['regularChestCount'] > 0]
+    if premium_users_only:
+        counts = counts[counts['isPremiumUser']]
+    return counts
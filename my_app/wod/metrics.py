@@ -0,0 +1,104 @@
+"""Lightweight timing and size measurements for queries and rendering.
+
+Every measurement is a flat dict (``kind``, ``name``, ``seconds`` plus
+optional ``bytes``, ``rows``, ``pages`` and ``decode_seconds``). They are
+kept in a bounded process-wide buffer, in the current run if one was started
+with :func:`start_run` (one Streamlit script run, one CLI invocation), and
+appended to the JSON-lines file named by ``WOD_METRICS_JSONL`` if it is set.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+HISTORY_SIZE = 5000
+JSONL_PATH = os.getenv('WOD_METRICS_JSONL')
+# Fields that describe a measurement rather than add up across measurements
+LABEL_FIELDS = ('time', 'kind', 'name', 'status')
+
+_history = deque(maxlen=HISTORY_SIZE)
+_lock = threading.Lock()
+_run = contextvars.ContextVar('wod_metrics_run', default=None)
+
+
+def start_run():
+    """Start collecting the measurements made from this thread (and its worker tasks) into a new list."""
+    samples = []
+    _run.set(samples)
+    return samples
+
+
+def current_run():
+    """Return a copy of the measurements of the current run, or an empty list if none was started."""
+    samples = _run.get()
+    return list(samples) if samples is not None else []
+
+
+def bind(func):
+    """Wrap ``func`` so that measurements it makes on another thread count towards the current run."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+
+def record(kind, name, seconds, **fields):
+    sample = {'time': time.time(), 'kind': kind, 'name': name, 'seconds': seconds}
+    sample.update(fields)
+    run = _run.get()
+    if run is not None:
+        run.append(sample)
+    with _lock:
+        _history.append(sample)
+        if JSONL_PATH:
+            with open(JSONL_PATH, 'a') as f:
+                f.write(json.dumps(sample) + '\n')
+    return sample
+
+
+@contextmanager
+def timed(name, kind='render', **fields):
+    """Record how long the block takes; the yielded dict can be filled with ``rows`` and the like."""
+    extra = dict(fields)
+    start = time.perf_counter()
+    try:
+        yield extra
+    finally:
+        record(kind, name, time.perf_counter() - start, **extra)
+
+
+def history():
+    """Return a copy of the most recent measurements of the whole process."""
+    with _lock:
+        return list(_history)
+
+
+def summarize(samples):
+    """Return ``{(kind, name): totals}`` with the count and summed fields of each kind of measurement."""
+    totals = {}
+    for sample in samples:
+        total = totals.setdefault((sample['kind'], sample['name']), {'count': 0})
+        total['count'] += 1
+        for field, value in sample.items():
+            if field not in LABEL_FIELDS and isinstance(value, (int, float)) and not isinstance(value, bool):
+                total[field] = total.get(field, 0) + value
+    return totals
+
+
+def to_jsonl(samples):
+    return ''.join(json.dumps(sample) + '\n' for sample in samples)
+
+
+def to_prometheus(samples):
+    """Render the summed measurements in the Prometheus text exposition format."""
+    lines = []
+    totals = summarize(samples)
+    fields = sorted({field for total in totals.values() for field in total})
+    for field in fields:
+        metric = 'wod_count_total' if field == 'count' else f'wod_{field}_total'
+        lines.append(f'# TYPE {metric} counter')
+        for (kind, name), total in sorted(totals.items()):
+            if field in total:
+                lines.append(f'{metric}{{kind="{kind}",name="{name}"}} {total[field]}')
+    return '\n'.join(lines) + '\n'
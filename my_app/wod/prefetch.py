@@ -0,0 +1,91 @@
+"""Background prefetching into a size-bounded LRU cache.
+
+Results are cached as futures, so a page asking for something that is still
+being prefetched waits on the same in-flight load instead of starting
+another one.
+
+Background loads outlive the script run that asked for them, so their
+measurements only go to the process-wide :func:`wod.metrics.history`. A key
+that :meth:`Prefetcher.get` finds missing is loaded on the calling thread and
+counts towards the caller's run.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class LRUCache:
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            self._evict()
+
+    def setdefault(self, key, factory):
+        """Return ``(value, created)``, storing ``factory()`` first if ``key`` is missing."""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key], False
+            value = self._items[key] = factory()
+            self._evict()
+            return value, True
+
+    def _evict(self):
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class Prefetcher:
+    def __init__(self, loader, maxsize=32, max_workers=2):
+        """Cache ``loader(*key)`` results, loading prefetched keys on a thread pool."""
+        self.loader = loader
+        self.cache = LRUCache(maxsize)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+
+    def _submit(self, key):
+        future, created = self.cache.setdefault(key, lambda: self._executor.submit(self.loader, *key))
+        if created:
+            future.add_done_callback(lambda done: self._forget_failure(key, done))
+        return future
+
+    def _forget_failure(self, key, future):
+        # Failed loads are not cached so that the next request retries
+        if future.exception() is not None:
+            self.cache.pop(key)
+
+    def get(self, key):
+        """Return the result for ``key``, waiting for an in-flight prefetch if there is one."""
+        future, created = self.cache.setdefault(key, Future)
+        if created:
+            try:
+                future.set_result(self.loader(*key))
+            except BaseException as e:
+                self.cache.pop(key)
+                future.set_exception(e)
+                raise
+        return future.result()
+
+    def prefetch(self, keys):
+        """Start loading ``keys`` in the background without waiting."""
+        for key in keys:
+            self._submit(key)
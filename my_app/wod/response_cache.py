@@ -0,0 +1,133 @@
+"""Process-wide cache of subgraph responses.
+
+Responses are keyed by a hash of the query text (whitespace-normalised) and
+its variables, kept for ``WOD_RESPONSE_TTL`` seconds in a size-bounded LRU
+cache, and optionally mirrored to a directory (``WOD_RESPONSE_CACHE_DIR``)
+so that several processes share them. A query that is already in flight is
+not sent again: later callers wait for the same response. Request volume
+therefore follows the number of distinct queries, not the number of
+sessions asking for them.
+
+Raw response bodies are cached, so every caller decodes its own copy and
+can modify it freely.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from .prefetch import LRUCache
+
+RESPONSE_TTL = int(os.getenv('WOD_RESPONSE_TTL', '30'))
+RESPONSE_CACHE_SIZE = int(os.getenv('WOD_RESPONSE_CACHE_SIZE', '256'))
+RESPONSE_CACHE_DIR = os.getenv('WOD_RESPONSE_CACHE_DIR')
+# Granularity that "now"-relative window bounds are rounded down to
+ROUND_SECONDS = 60
+
+
+def round_timestamp(timestamp, seconds=ROUND_SECONDS):
+    """Round a unix timestamp down to a multiple of ``seconds`` so that windows ending "now" share a cache key.
+
+    Only for the bounds of a requested window; pagination cursors must be
+    sent unchanged.
+    """
+    return int(timestamp) // seconds * seconds
+
+
+def request_key(query, variables=None):
+    payload = json.dumps({'query': ' '.join(query.split()), 'variables': variables or {}},
+                         sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class _Entry:
+    __slots__ = ('future', 'expires')
+
+    def __init__(self):
+        self.future = Future()
+        # Only starts counting down once the response has arrived
+        self.expires = float('inf')
+
+
+class ResponseCache:
+    def __init__(self, ttl=RESPONSE_TTL, maxsize=RESPONSE_CACHE_SIZE, directory=RESPONSE_CACHE_DIR):
+        """Cache response bodies for ``ttl`` seconds, at most ``maxsize`` in memory."""
+        self.ttl = ttl
+        self.directory = directory
+        self._entries = LRUCache(maxsize)
+        self._lock = threading.Lock()
+
+    def get(self, query, variables, fetch):
+        """Return ``(body, hit)`` for a query, calling ``fetch()`` only if no fresh or in-flight response exists.
+
+        ``hit`` is false only for the caller that actually fetched. Failed
+        fetches are not cached; their error is raised in every waiting caller.
+        """
+        key = request_key(query, variables)
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None or entry.expires <= time.monotonic()
+            if owner:
+                entry = _Entry()
+                self._entries.put(key, entry)
+        if not owner:
+            return entry.future.result(), True
+
+        try:
+            body = self._read_disk(key)
+            hit = body is not None
+            if not hit:
+                body = fetch()
+                self._write_disk(key, body)
+        except BaseException as e:
+            self._discard(key, entry)
+            entry.future.set_exception(e)
+            raise
+        entry.expires = time.monotonic() + self.ttl
+        entry.future.set_result(body)
+        return body, hit
+
+    def discard(self, query, variables=None):
+        """Drop a cached response, for instance one that carries GraphQL errors."""
+        key = request_key(query, variables)
+        self._discard(key, self._entries.get(key))
+        if self.directory:
+            try:
+                os.remove(self._disk_path(key))
+            except FileNotFoundError:
+                pass
+
+    def _discard(self, key, entry):
+        with self._lock:
+            if entry is not None and self._entries.get(key) is entry:
+                self._entries.pop(key)
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) >= self.ttl:
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key, body):
+        if not self.directory:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,70 @@
+"""Sybil feature extraction split across processes.
+
+Users are assigned to shards by a stable hash of their address, every shard
+reads its own users' events from the local store and runs
+:func:`wod.features.extract_features` in a worker process, and the shard
+tables are merged back in address order. Features are computed per user, so
+the merged table is identical to a single-process run over all events.
+"""
+import logging
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from . import store
+from .events import ChestOpens
+from .features import extract_features
+
+# Users per `IN (...)` lookup, below SQLite's default host parameter limit
+QUERY_BATCH_SIZE = 500
+
+
+def shard_of(address, n_shards):
+    """Return the shard of ``address``, the same in every process and on every run."""
+    return zlib.crc32(address.lower().encode()) % n_shards
+
+
+def split_users(user_ids, n_shards):
+    """Return ``n_shards`` lists of users, each in the order of ``user_ids``."""
+    shards = [[] for _ in range(n_shards)]
+    for user in user_ids:
+        shards[shard_of(user, n_shards)].append(user)
+    return shards
+
+
+def extract_shard(user_ids, path=store.DEFAULT_PATH):
+    """Read the events of ``user_ids`` from the store and return their features."""
+    batches = (user_ids[i:i + QUERY_BATCH_SIZE] for i in range(0, len(user_ids), QUERY_BATCH_SIZE))
+    frames = chain.from_iterable(store.iter_chest_opens(user=batch, chunksize=100000, path=path) for batch in batches)
+    return extract_features(ChestOpens.from_frames(frames), user_ids=user_ids)
+
+
+def extract_features_parallel(user_ids=None, n_shards=None, workers=None, path=store.DEFAULT_PATH):
+    """Return the features of ``user_ids`` (every stored user by default), one shard per worker task.
+
+    ``n_shards`` defaults to the number of workers, which defaults to the
+    number of CPUs. Rows come back sorted by ``user_id``.
+    """
+    workers = workers or os.cpu_count() or 1
+    n_shards = n_shards or workers
+    if user_ids is None:
+        user_ids = store.load_users(path)['id'].tolist()
+    user_ids = sorted(user_ids)
+    shards = [shard for shard in split_users(user_ids, n_shards) if shard]
+
+    if workers == 1:
+        tables = [extract_shard(shard, path) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards) or 1)) as executor:
+            tables = list(executor.map(extract_shard, shards, [path] * len(shards)))
+    logging.info(f"Extracted features of {len(user_ids)} users in {len(shards)} shards")
+
+    if not tables:
+        return extract_features(ChestOpens(), user_ids=user_ids)
+    features = pd.concat(tables, ignore_index=True)
+    order = np.argsort(features['user_id'].to_numpy(), kind='stable')
+    return features.iloc[order].reset_index(drop=True)
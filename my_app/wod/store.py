@@ -0,0 +1,316 @@
+"""Local SQLite copy of the subgraph data.
+
+Holds every ``ChestOpened`` event plus the latest ``User`` and
+``DailyChestOpen`` snapshots so that pages and the Sybil scripts read from
+disk instead of querying the indexer on every rerun. ``sync`` only fetches
+events at or after the stored high-water block.
+
+    python -m wod.store sync [--full]
+"""
+import argparse
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import closing
+
+import pandas as pd
+
+from . import metrics
+from .events import ChestOpens
+from .pagination import iter_pages
+
+DEFAULT_PATH = os.getenv(
+    'WOD_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'wod.sqlite'),
+)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS chest_openeds (
+    id TEXT PRIMARY KEY,
+    user TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    isPremium INTEGER NOT NULL,
+    blockNumber INTEGER NOT NULL,
+    logIndex INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chest_openeds_block ON chest_openeds (blockNumber, logIndex);
+CREATE INDEX IF NOT EXISTS chest_openeds_timestamp ON chest_openeds (timestamp);
+CREATE INDEX IF NOT EXISTS chest_openeds_user_timestamp ON chest_openeds (user, timestamp);
+
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    lifetimeChestCount INTEGER NOT NULL,
+    lifetimePremiumChestCount INTEGER NOT NULL,
+    lifetimeTotalChestCount INTEGER NOT NULL,
+    isPremiumUser INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS daily_chest_opens (
+    date TEXT PRIMARY KEY,
+    regularChestCount INTEGER NOT NULL,
+    premiumChestCount INTEGER NOT NULL,
+    totalChestCount INTEGER NOT NULL
+);
+'''
+
+CHEST_OPENED_FIELDS = '''
+        timestamp
+        isPremium
+        blockNumber
+        logIndex
+        user { id }
+'''
+
+USER_FIELDS = '''
+        lifetimeChestCount
+        lifetimePremiumChestCount
+        lifetimeTotalChestCount
+        isPremiumUser
+'''
+
+DAILY_CHEST_OPEN_FIELDS = '''
+        date
+        regularChestCount
+        premiumChestCount
+        totalChestCount
+'''
+
+# Users refreshed per `id_in` query
+ID_BATCH_SIZE = 1000
+
+# Bumped whenever stored rows become incompatible with the subgraph
+SCHEMA_VERSION = 1
+
+_sync_lock = threading.Lock()
+
+
+def connect(path=DEFAULT_PATH):
+    """Open the store, creating the file and tables if needed."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+        # Event ids changed to tx hash plus log index, so older rows cannot be kept
+        conn.executescript('DROP TABLE IF EXISTS chest_openeds;')
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def high_water_block(conn):
+    """Return the newest stored event block, or 0 for an empty store."""
+    return conn.execute('SELECT COALESCE(MAX(blockNumber), 0) FROM chest_openeds').fetchone()[0]
+
+
+def _sync_chest_openeds(conn, client):
+    touched = set()
+    count = 0
+    for page in iter_pages('chestOpeneds', CHEST_OPENED_FIELDS, cursor='blockNumber',
+                           start=high_water_block(conn), client=client):
+        rows = [(e['id'], e['user']['id'], int(e['timestamp']), int(e['isPremium']),
+                 int(e['blockNumber']), int(e['logIndex'])) for e in page]
+        with conn:
+            before = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO chest_openeds VALUES (?, ?, ?, ?, ?, ?)', rows)
+            count += conn.total_changes - before
+        touched.update(row[1] for row in rows)
+    return count, touched
+
+
+def _upsert_users(conn, pages):
+    count = 0
+    for page in pages:
+        rows = [(u['id'], u['lifetimeChestCount'], u['lifetimePremiumChestCount'],
+                 u['lifetimeTotalChestCount'], int(u['isPremiumUser'])) for u in page]
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?)', rows)
+        count += len(rows)
+    return count
+
+
+def _sync_users(conn, client, user_ids, full):
+    if full:
+        return _upsert_users(conn, iter_pages('users', USER_FIELDS, client=client))
+    user_ids = sorted(user_ids)
+    count = 0
+    for i in range(0, len(user_ids), ID_BATCH_SIZE):
+        batch = user_ids[i:i + ID_BATCH_SIZE]
+        count += _upsert_users(conn, iter_pages('users', USER_FIELDS, where={'id_in': batch}, client=client))
+    return count
+
+
+def _sync_daily_chest_opens(conn, client):
+    # The newest day is still filling up, so it is always refetched
+    last_date = conn.execute('SELECT COALESCE(MAX(date), \'\') FROM daily_chest_opens').fetchone()[0]
+    count = 0
+    for page in iter_pages('dailyChestOpens', DAILY_CHEST_OPEN_FIELDS, cursor='date', start=last_date, client=client):
+        rows = [(d['date'], d['regularChestCount'], d['premiumChestCount'], d['totalChestCount']) for d in page]
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO daily_chest_opens VALUES (?, ?, ?, ?)', rows)
+        count += len(rows)
+    return count
+
+
+def sync(path=DEFAULT_PATH, full=False, client=None):
+    """Bring the store up to date with the subgraph.
+
+    Only events at or after the high-water block are fetched, and only
+    users with new events are refreshed, unless ``full`` is set or the store
+    has no users yet. Returns the number of rows written per table.
+    """
+    with _sync_lock, closing(connect(path)) as conn, metrics.timed('store', kind='sync') as sample:
+        events, touched = _sync_chest_openeds(conn, client)
+        full = full or conn.execute('SELECT COUNT(*) FROM users').fetchone()[0] == 0
+        users = _sync_users(conn, client, touched, full)
+        days = _sync_daily_chest_opens(conn, client)
+        sample['rows'] = events + users + days
+    logging.info(f"Synced {events} new chest opens, {users} users and {days} days into {path}")
+    return {'chest_openeds': events, 'users': users, 'daily_chest_opens': days}
+
+
+def _table_name(sql):
+    match = re.search(r'\bFROM\s+(\w+)', sql)
+    return match.group(1) if match else 'store'
+
+
+def _read(sql, params=(), path=DEFAULT_PATH):
+    with closing(connect(path)) as conn, metrics.timed(_table_name(sql), kind='read') as sample:
+        df = pd.read_sql_query(sql, conn, params=params)
+        sample['rows'] = len(df)
+    return df
+
+
+def _chest_opens_query(start, end, user):
+    clauses, params = [], []
+    if start is not None:
+        clauses.append('timestamp >= ?')
+        params.append(int(start))
+    if end is not None:
+        clauses.append('timestamp <= ?')
+        params.append(int(end))
+    if isinstance(user, (list, tuple)):
+        clauses.append(f"user IN ({', '.join('?' * len(user))})")
+        params.extend(user)
+    elif user is not None:
+        clauses.append('user = ?')
+        params.append(user)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    sql = f'''
+        SELECT id, user, timestamp, isPremium, blockNumber, logIndex FROM chest_openeds {where}
+        ORDER BY blockNumber, logIndex
+    '''
+    return sql, params
+
+
+def load_chest_opens(start=None, end=None, user=None, path=DEFAULT_PATH):
+    """Return events ordered by time, optionally limited to ``[start, end]`` and one user or a list of users."""
+    sql, params = _chest_opens_query(start, end, user)
+    df = _read(sql, params, path)
+    df['isPremium'] = df['isPremium'].astype(bool)
+    return df
+
+
+def iter_chest_opens(start=None, end=None, user=None, chunksize=10000, path=DEFAULT_PATH):
+    """Yield the events of :func:`load_chest_opens` as frames of at most ``chunksize`` rows."""
+    sql, params = _chest_opens_query(start, end, user)
+    with closing(connect(path)) as conn:
+        for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunksize):
+            chunk['isPremium'] = chunk['isPremium'].astype(bool)
+            yield chunk
+
+
+def load_events(start=None, end=None, user=None, chunksize=100000, path=DEFAULT_PATH, addresses=None):
+    """Return the events of :func:`load_chest_opens` as a compact :class:`wod.events.ChestOpens`."""
+    return ChestOpens.from_frames(iter_chest_opens(start, end, user, chunksize, path), addresses)
+
+
+def active_users(start, is_premium=None, path=DEFAULT_PATH):
+    """Return the ids of users with at least one open since ``start``."""
+    sql = 'SELECT DISTINCT user FROM chest_openeds WHERE timestamp >= ?'
+    params = [int(start)]
+    if is_premium is not None:
+        sql += ' AND isPremium = ?'
+        params.append(int(is_premium))
+    return _read(sql, params, path)['user'].tolist()
+
+
+def ranked_active_users(start, is_premium=None, path=DEFAULT_PATH):
+    """Return the ids of :func:`active_users` with any lifetime opens, most lifetime opens first."""
+    users = load_users(path)
+    users = users[users['id'].isin(active_users(start, is_premium, path)) & (users['lifetimeTotalChestCount'] > 0)]
+    return users.sort_values('lifetimeTotalChestCount', ascending=False)['id'].tolist()
+
+
+def window_counts(start, end=None, path=DEFAULT_PATH):
+    """Return per-user regular/premium/total opens in ``[start, end]``, aggregated by SQLite."""
+    sql = '''
+        SELECT c.user AS id,
+               SUM(1 - c.isPremium) AS regularChestCount,
+               SUM(c.isPremium) AS premiumChestCount,
+               COUNT(*) AS totalChestCount,
+               COALESCE(u.isPremiumUser, 0) AS isPremiumUser
+        FROM chest_openeds c LEFT JOIN users u ON u.id = c.user
+        WHERE c.timestamp >= ?{end_clause}
+        GROUP BY c.user
+    '''.format(end_clause=' AND c.timestamp <= ?' if end is not None else '')
+    params = [int(start)] + ([int(end)] if end is not None else [])
+    df = _read(sql, params, path)
+    df['isPremiumUser'] = df['isPremiumUser'].astype(bool)
+    return df
+
+
+def load_users(path=DEFAULT_PATH):
+    """Return the latest snapshot of every user."""
+    df = _read('SELECT * FROM users ORDER BY id', path=path)
+    df['isPremiumUser'] = df['isPremiumUser'].astype(bool)
+    return df
+
+
+def load_user(user_id, path=DEFAULT_PATH):
+    """Return one user's snapshot as a dict, or ``None`` if it is not stored."""
+    with closing(connect(path)) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+    if row is None:
+        return None
+    user = dict(row)
+    user['isPremiumUser'] = bool(user['isPremiumUser'])
+    return user
+
+
+def sync_daily_chest_opens(path=DEFAULT_PATH, client=None):
+    """Refresh only the daily totals from the newest stored day on; one query on most calls."""
+    with _sync_lock, closing(connect(path)) as conn, metrics.timed('daily_chest_opens', kind='sync') as sample:
+        sample['rows'] = _sync_daily_chest_opens(conn, client)
+    return sample['rows']
+
+
+def load_daily_chest_opens(since=None, before=None, path=DEFAULT_PATH):
+    """Return the daily totals ordered by date, optionally limited to ``since <= date < before``."""
+    clauses, params = [], []
+    if since is not None:
+        clauses.append('date >= ?')
+        params.append(since)
+    if before is not None:
+        clauses.append('date < ?')
+        params.append(before)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    return _read(f'SELECT * FROM daily_chest_opens {where} ORDER BY date', params, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the local chest-open store from the subgraph")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    sync_parser = subparsers.add_parser('sync', help="fetch new events and refresh snapshots")
+    sync_parser.add_argument('--full', action='store_true', help="refresh every user, not only those with new events")
+    sync_parser.add_argument('--path', default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'sync':
+        sync(args.path, full=args.full)
+
+
+if __name__ == '__main__':
+    main()
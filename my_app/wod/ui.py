@@ -0,0 +1,80 @@
+"""Streamlit glue shared by the pages."""
+import os
+
+import pandas as pd
+import streamlit as st
+
+from . import metrics, store, views
+from .client import QueryError
+
+STORE_TTL = int(os.getenv('WOD_STORE_TTL', '300'))
+PAGE_SIZES = (50, 100, 500)
+# Seconds between checks for a newer precomputed views version
+VIEWS_POLL = 5
+
+
+@st.cache_data(ttl=STORE_TTL, show_spinner="Syncing chest opens...")
+def _sync_store():
+    return store.sync()
+
+
+@st.cache_data(ttl=VIEWS_POLL, show_spinner=False)
+def views_snapshot():
+    """Return the current :mod:`wod.views` version and its refresh metadata, read together.
+
+    ``(None, {})`` if no scheduler has published one, if that version was
+    pruned before its metadata could be read, or if the scheduler has not
+    refreshed anything for a few intervals; pages then compute on demand.
+    """
+    version = views.current_version()
+    meta = views.refreshed(version) if version else {}
+    return (version, meta) if views.is_fresh(meta) else (None, {})
+
+
+def views_version():
+    """Return the current :mod:`wod.views` version, or ``None`` if no scheduler has published one."""
+    return views_snapshot()[0]
+
+
+def ensure_store():
+    """Sync the local store at most once per ``WOD_STORE_TTL`` seconds across sessions."""
+    try:
+        _sync_store()
+    except QueryError as e:
+        st.warning(f"Showing locally stored data, sync failed: {e}")
+
+
+def paginate(df, key, page_sizes=PAGE_SIZES):
+    """Return the page of ``df`` picked with a page-size select box and page number, so only that page is sent."""
+    col1, col2 = st.columns(2)
+    with col1:
+        page_size = st.selectbox('Rows per page', page_sizes, index=1, key=f'{key}_page_size')
+    n_pages = max((len(df) + page_size - 1) // page_size, 1)
+    with col2:
+        page = st.number_input(f'Page (of {n_pages})', 1, n_pages, 1, key=f'{key}_page')
+    start = (page - 1) * page_size
+    st.caption(f"Rows {start + 1}–{min(start + page_size, len(df))} of {len(df)}")
+    return df.iloc[start:start + page_size]
+
+
+def start_metrics():
+    """Collect this script run's query, read and render timings for :func:`debug_panel`."""
+    metrics.start_run()
+
+
+def debug_panel():
+    """Show the timings collected since :func:`start_metrics` in a collapsed expander."""
+    samples = metrics.current_run()
+    with st.expander("Debug: timings"):
+        if not samples:
+            st.caption("Nothing was fetched or rendered in this run; everything came from the cache.")
+            return
+        totals = pd.DataFrame([dict(kind=kind, name=name, **total)
+                               for (kind, name), total in metrics.summarize(samples).items()])
+        st.dataframe(totals, hide_index=True)
+        st.dataframe(pd.DataFrame(samples).drop(columns='time'), hide_index=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("JSON lines", metrics.to_jsonl(samples), file_name='wod-metrics.jsonl')
+        with col2:
+            st.download_button("Prometheus", metrics.to_prometheus(samples), file_name='wod-metrics.prom')
@@ -0,0 +1,263 @@
+"""Precomputed dashboard views, refreshed by a scheduler process.
+
+The scheduler syncs the local store and rebuilds each group of views when it
+is due (leaderboards for 1, 7 and 30 days, the daily series and the User
+Details list every few minutes, Sybil clusters hourly). Each refresh is
+written to a new versioned SQLite snapshot; groups that were not due are
+copied over from the previous one. Only once the snapshot is complete is the
+``CURRENT`` pointer replaced, with an atomic rename, so pages always read
+one consistent version and never wait on a computation. The last few
+versions are kept for readers that still have an older one open.
+
+    python -m wod.views run [--interval 60] [--once]
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas as pd
+
+from . import metrics, store
+
+VIEWS_DIR = os.getenv('WOD_VIEWS_DIR', os.path.join(os.path.dirname(store.DEFAULT_PATH), 'views'))
+POINTER = 'CURRENT'
+KEEP_VERSIONS = 3
+
+LEADERBOARD_DAYS = (1, 7, 30)
+# Window of the User Details navigation list
+ACTIVE_USER_DAYS = 7
+# Parameters of the precomputed scan; the sampled backend bounds its memory
+# whatever the number of wallets, and the Sybil Scan page starts from them
+SYBIL_PARAMS = {'method': 'sampled', 'eps': 0.5, 'min_samples': 25}
+
+# Seconds between rebuilds of each group of views
+SCHEDULE = {
+    'leaderboards': int(os.getenv('WOD_VIEWS_LEADERBOARD_INTERVAL', '300')),
+    'daily': int(os.getenv('WOD_VIEWS_DAILY_INTERVAL', '300')),
+    'users': int(os.getenv('WOD_VIEWS_USERS_INTERVAL', '300')),
+    'sybil': int(os.getenv('WOD_VIEWS_SYBIL_INTERVAL', '3600')),
+}
+# Pages ignore a snapshot once its newest refresh is older than this many of
+# the shortest intervals, so a stopped scheduler does not freeze them
+STALE_INTERVALS = 3
+TABLES = {
+    'leaderboards': [f'leaderboard_{days}d' for days in LEADERBOARD_DAYS],
+    'daily': ['daily_chest_opens'],
+    'users': ['active_users'],
+    'sybil': ['sybil_scan'],
+}
+
+
+def _build_leaderboards(now, path):
+    return {f'leaderboard_{days}d': store.window_counts(now - days * 86400, path=path) for days in LEADERBOARD_DAYS}
+
+
+def _build_daily(now, path):
+    return {'daily_chest_opens': store.load_daily_chest_opens(path=path)}
+
+
+def _build_users(now, path):
+    users = store.ranked_active_users(now - ACTIVE_USER_DAYS * 86400, is_premium=False, path=path)
+    return {'active_users': pd.DataFrame({'id': users})}
+
+
+def _build_sybil(now, path):
+    from sklearn.decomposition import PCA
+
+    from . import feature_store
+    from .clustering import cluster, fit_scaling
+
+    feature_store.update(path)
+    features = feature_store.load_features(user_ids=store.load_users(path)['id'].tolist(), path=path)
+    if features.empty:
+        return {'sybil_scan': features.assign(cluster=pd.Series(dtype='int64'), pca_x=0.0, pca_y=0.0)}
+    _, _, X_scaled = fit_scaling(features)
+    result = cluster(X_scaled, **SYBIL_PARAMS)
+    X_pca = PCA(n_components=2).fit_transform(X_scaled)
+    return {'sybil_scan': features.assign(cluster=result.labels, pca_x=X_pca[:, 0], pca_y=X_pca[:, 1])}
+
+
+BUILDERS = {
+    'leaderboards': _build_leaderboards,
+    'daily': _build_daily,
+    'users': _build_users,
+    'sybil': _build_sybil,
+}
+
+
+def current_version(views_dir=VIEWS_DIR):
+    """Return the version the pointer names, or ``None`` before the first refresh."""
+    try:
+        with open(os.path.join(views_dir, POINTER)) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version if os.path.exists(snapshot_path(version, views_dir)) else None
+
+
+def snapshot_path(version, views_dir=VIEWS_DIR):
+    return os.path.join(views_dir, f'{version}.sqlite')
+
+
+def _connect(version, views_dir):
+    # Snapshots are immutable once published
+    return sqlite3.connect(f'file:{snapshot_path(version, views_dir)}?mode=ro', uri=True, check_same_thread=False)
+
+
+def refreshed(version=None, views_dir=VIEWS_DIR):
+    """Return ``{group: (refreshedAt, params)}`` for the groups of a snapshot.
+
+    A version that has since been pruned has no groups, like one that was
+    never published.
+    """
+    version = version or current_version(views_dir)
+    if version is None:
+        return {}
+    try:
+        with closing(_connect(version, views_dir)) as conn:
+            rows = conn.execute('SELECT viewGroup, refreshedAt, params FROM view_meta').fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {group: (refreshed_at, json.loads(params)) for group, refreshed_at, params in rows}
+
+
+def is_fresh(meta, now=None, schedule=SCHEDULE):
+    """Return whether a snapshot's ``refreshed`` metadata shows a scheduler that is still running."""
+    if not meta:
+        return False
+    now = time.time() if now is None else now
+    newest = max(refreshed_at for refreshed_at, _ in meta.values())
+    return now - newest <= STALE_INTERVALS * min(schedule.values())
+
+
+def load_view(name, version=None, views_dir=VIEWS_DIR):
+    """Return one view of a snapshot (the current one by default) as a frame, or ``None`` if it is missing."""
+    version = version or current_version(views_dir)
+    if version is None or not os.path.exists(snapshot_path(version, views_dir)):
+        return None
+    with closing(_connect(version, views_dir)) as conn, metrics.timed(name, kind='view') as sample:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+        if not exists:
+            return None
+        df = pd.read_sql_query(f'SELECT * FROM "{name}"', conn)
+        sample['rows'] = len(df)
+    if 'isPremiumUser' in df.columns:
+        df['isPremiumUser'] = df['isPremiumUser'].astype(bool)
+    return df
+
+
+def publish(tables, groups, previous=None, views_dir=VIEWS_DIR, keep=KEEP_VERSIONS, now=None):
+    """Write ``tables`` (rebuilt for ``groups``) plus every other group of ``previous`` as a new version.
+
+    The snapshot is built under a temporary name and renamed into place, then
+    the pointer is swapped the same way. Returns the new version.
+    """
+    now = int(now if now is not None else time.time())
+    os.makedirs(views_dir, exist_ok=True)
+    version = f'{time.strftime("%Y%m%dT%H%M%S", time.gmtime(now))}-{time.time_ns() % 10**9:09d}'
+    path = snapshot_path(version, views_dir)
+    tmp = f'{path}.tmp'
+
+    with closing(sqlite3.connect(tmp)) as conn:
+        conn.execute('CREATE TABLE view_meta (viewGroup TEXT PRIMARY KEY, refreshedAt INTEGER NOT NULL, params TEXT)')
+        if previous is not None:
+            conn.execute('ATTACH DATABASE ? AS previous', (snapshot_path(previous, views_dir),))
+            for group in set(TABLES) - set(groups):
+                for name in TABLES[group]:
+                    exists = conn.execute("SELECT 1 FROM previous.sqlite_master WHERE type = 'table' AND name = ?",
+                                          (name,)).fetchone()
+                    if exists:
+                        conn.execute(f'CREATE TABLE "{name}" AS SELECT * FROM previous."{name}"')
+            conn.execute('INSERT INTO view_meta SELECT * FROM previous.view_meta WHERE viewGroup NOT IN ({})'.format(
+                ', '.join('?' * len(groups))), list(groups))
+            conn.commit()
+            conn.execute('DETACH DATABASE previous')
+        for name, df in tables.items():
+            df.to_sql(name, conn, index=False)
+        params = {'sybil': SYBIL_PARAMS}
+        conn.executemany('INSERT OR REPLACE INTO view_meta VALUES (?, ?, ?)',
+                         [(group, now, json.dumps(params.get(group, {}))) for group in groups])
+        conn.commit()
+    os.replace(tmp, path)
+
+    pointer = os.path.join(views_dir, POINTER)
+    with open(f'{pointer}.tmp', 'w') as f:
+        f.write(version)
+    os.replace(f'{pointer}.tmp', pointer)
+    _prune(views_dir, keep)
+    return version
+
+
+def _prune(views_dir, keep):
+    current = current_version(views_dir)
+    versions = sorted(name[:-len('.sqlite')] for name in os.listdir(views_dir) if name.endswith('.sqlite'))
+    for version in versions[:-keep]:
+        if version == current:
+            continue
+        # Readers that still have an old snapshot open keep their file handle
+        os.remove(snapshot_path(version, views_dir))
+
+
+def due_groups(now, views_dir=VIEWS_DIR, schedule=SCHEDULE):
+    """Return the groups whose views are missing or older than their interval."""
+    done = refreshed(views_dir=views_dir)
+    return [group for group, interval in schedule.items() if group not in done or now - done[group][0] >= interval]
+
+
+def refresh(groups=None, path=store.DEFAULT_PATH, views_dir=VIEWS_DIR, now=None):
+    """Rebuild ``groups`` (the due ones by default) from the store and publish them as a new version.
+
+    Returns the new version, or ``None`` if nothing was due.
+    """
+    now = int(now if now is not None else time.time())
+    groups = list(groups) if groups is not None else due_groups(now, views_dir)
+    if not groups:
+        return None
+    tables = {}
+    for group in groups:
+        with metrics.timed(group, kind='view_build') as sample:
+            built = BUILDERS[group](now, path)
+            sample['rows'] = sum(len(df) for df in built.values())
+        tables.update(built)
+    version = publish(tables, groups, current_version(views_dir), views_dir, now=now)
+    logging.info(f"Published views {version} with fresh {', '.join(groups)}")
+    return version
+
+
+def run(interval=60, path=store.DEFAULT_PATH, views_dir=VIEWS_DIR, sync=True, once=False):
+    """Sync the store and refresh the due views every ``interval`` seconds."""
+    while True:
+        if sync:
+            try:
+                store.sync(path)
+            except Exception:
+                # Views are still rebuilt from what is stored; the next round retries
+                logging.exception("Store sync failed")
+        refresh(path=path, views_dir=views_dir)
+        if once:
+            return
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the precomputed dashboard views on a schedule")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help="sync and refresh due views in a loop")
+    run_parser.add_argument('--interval', type=int, default=60, help="seconds between checks for due views")
+    run_parser.add_argument('--once', action='store_true', help="refresh the due views once and exit")
+    run_parser.add_argument('--no-sync', action='store_true', help="build from the store without syncing it")
+    run_parser.add_argument('--path', default=store.DEFAULT_PATH)
+    run_parser.add_argument('--views-dir', default=VIEWS_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'run':
+        run(args.interval, args.path, args.views_dir, sync=not args.no_sync, once=args.once)
+
+
+if __name__ == '__main__':
+    main()
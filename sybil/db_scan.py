@@ -1,43 +1,58 @@
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import DBSCAN
-from sklearn.impute import SimpleImputer
-from sklearn.decomposition import PCA
+import argparse
+import os
+import sys
+import numpy as np
 import matplotlib.pyplot as plt
 
-# Load the data from CSV
-file_path = 'user_data_features.csv'
-X = pd.read_csv(file_path)
-
-# Handle NaN values by imputing with the mean of each column
-imputer = SimpleImputer(strategy='mean')
-X_numeric = X.drop(columns=["user_id"])  # Keep all columns except 'user_id'
-X_imputed = imputer.fit_transform(X_numeric)
-
-# Normalize the features
-X_scaled = StandardScaler().fit_transform(X_imputed)
-
-# Apply DBSCAN
-dbscan = DBSCAN(eps=0.5, min_samples=25)  # Tune these parameters
-X['cluster'] = dbscan.fit_predict(X_scaled)
+# Share the clustering backends with the Streamlit app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'my_app'))
+from wod import feature_matrix
+from wod.clustering import METHODS, cluster
+
+parser = argparse.ArgumentParser(description="Cluster user features to find potential Sybils")
+parser.add_argument('--method', choices=METHODS, default='dbscan', help="clustering backend")
+parser.add_argument('--eps', type=float, default=0.5)
+parser.add_argument('--min-samples', type=int, default=25)
+parser.add_argument('--n-jobs', type=int, default=-1, help="parallel neighbour queries for tree backends")
+parser.add_argument('--memory', action='store_true', help="cluster again under tracemalloc to report peak memory")
+parser.add_argument('--chunksize', type=int, default=feature_matrix.CHUNK_SIZE, help="rows scaled and projected at a time")
+args = parser.parse_args()
+
+# Memory-map the feature matrix written by sybil_detection.py
+file_path = 'user_data_features.npy'
+user_ids, X = feature_matrix.open_matrix(file_path)
+
+# Impute NaN values with the column means and normalize the features, streaming
+# the statistics and the scaled rows through a second memory-mapped file
+scaling = feature_matrix.fit_scaling(X, args.chunksize)
+X_scaled = feature_matrix.scale(X, scaling, 'user_data_scaled.npy', args.chunksize)
+
+# Apply the selected clustering backend
+result = cluster(X_scaled, args.method, eps=args.eps, min_samples=args.min_samples, n_jobs=args.n_jobs,
+                 measure_memory=args.memory)
+labels = result.labels
+if result.peak_memory is None:
+    print(f"{args.method} clustering took {result.seconds:.2f}s")
+else:
+    print(f"{args.method} clustering took {result.seconds:.2f}s, peak memory {result.peak_memory / 2**20:.1f} MiB")
 
 # Identify potential Sybils by looking at clusters with multiple users
-sybil_clusters = X[X['cluster'] != -1].groupby('cluster').filter(lambda x: len(x) > 1)
+clusters, sizes = np.unique(labels[labels != -1], return_counts=True)
+sybil_clusters = clusters[sizes > 1]
 
 # Logic to deduce if Sybils are found
-if not sybil_clusters.empty:
-    print(f"Potential Sybil clusters found: {sybil_clusters['cluster'].unique()}")
-    print(f"Number of users in potential Sybil clusters: {len(sybil_clusters)}")
+if len(sybil_clusters):
+    print(f"Potential Sybil clusters found: {sybil_clusters}")
+    print(f"Number of users in potential Sybil clusters: {sizes[sizes > 1].sum()}")
 else:
     print("No potential Sybil clusters found.")
 
 # Perform PCA for visualization
-pca = PCA(n_components=2)
-X_pca = pca.fit_transform(X_scaled)
+X_pca, pca = feature_matrix.project(X_scaled, n_components=2, chunksize=args.chunksize)
 
 # Plot the PCA results
 plt.figure(figsize=(10, 7))
-plt.scatter(X_pca[:, 0], X_pca[:, 1], c=X['cluster'], cmap='viridis', marker='o', edgecolor='k', s=50)
+plt.scatter(X_pca[:, 0], X_pca[:, 1], c=labels, cmap='viridis', marker='o', edgecolor='k', s=50)
 plt.title('PCA of User Data')
 plt.xlabel('PCA Component 1')
 plt.ylabel('PCA Component 2')
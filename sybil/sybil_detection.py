@@ -1,117 +1,79 @@
-import pandas as pd
-import requests
-import numpy as np
-from datetime import datetime
-from scipy.stats import entropy
+import argparse
 import os
-from dotenv import load_dotenv
+import sys
 import logging
 
-load_dotenv()
+# Share the local event store with the Streamlit app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'my_app'))
+from wod import cooccurrence, feature_matrix, feature_store, shards, store
+from wod.features import FEATURE_COLUMNS
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+matrix_path = 'user_data_features.npy'
+output_file_path = 'user_data_features.csv'
 
-# Function to execute GraphQL query
-def execute_query(query, variables=None):
-    url = os.getenv('SUBGRAPH_URL')
-    response = requests.post(url, json={'query': query, 'variables': variables})
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"Query failed with status code {response.status_code}")
-
-# GraphQL query to fetch user data
-USER_DATA_QUERY = '''
-query UserData {
-  users {
-    id
-    lifetimeChestCount
-    lifetimePremiumChestCount
-    chestOpens(orderBy: timestamp, orderDirection: asc) {
-      timestamp
-      isPremium
-    }
-  }
-}
-'''
-
-# Function to fetch all user data with pagination
-def fetch_all_user_data():
-    all_users = []
-    first = 100
-    skip = 0
-    max_users = 500  # Limit to the first 500 users
-    logging.info("Starting to fetch user data with pagination.")
-    while len(all_users) < max_users:
-        logging.info(f"Fetching users with skip={skip} and first={first}.")
-        variables = {'first': first, 'skip': skip}
-        response_data = execute_query(USER_DATA_QUERY, variables)
-        users = response_data.get('data', {}).get('users', [])
-        if not users:
-            logging.info("No more users to fetch. Exiting loop.")
-            break
-        all_users.extend(users)
-        skip += first
-        if len(all_users) >= max_users:
-            logging.info(f"Reached the limit of {max_users} users. Stopping fetch.")
-            all_users = all_users[:max_users]  # Trim to exactly 500 users if exceeded
-            break
-    logging.info(f"Fetched a total of {len(all_users)} users.")
-    return all_users
-
-# Fetch all user data
-logging.info("Fetching all user data.")
-user_data = fetch_all_user_data()
-
-# Initialize lists to hold features
-logging.info("Initializing feature lists.")
-user_ids, total_chests, premium_chests, avg_time_interval, burst_count, daily_entropy = [], [], [], [], [], []
-
-for user in user_data:
-    logging.info(f"Processing user {user['id']}.")
-    user_id = user["id"]
-    events = user["chestOpens"]
-    
-    # Feature 1: Total chests opened
-    total_chests.append(user["lifetimeChestCount"])
-    
-    # Feature 2: Total premium chests opened
-    premium_chests.append(user["lifetimePremiumChestCount"])
-    
-    # Feature 3: Average time interval between chests
-    timestamps = [int(event["timestamp"]) for event in events]  # Convert timestamps to integers
-    if len(timestamps) > 1:
-        intervals = [timestamps[i + 1] - timestamps[i] for i in range(len(timestamps) - 1)]
-        avg_time_interval.append(sum(intervals) / len(intervals))
+
+def features_to_csv(frames):
+    for i, frame in enumerate(frames):
+        frame.to_csv(output_file_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        yield frame
+
+
+def with_timing(frame, timing):
+    # Wallets without a correlated pair get no shared buckets and a group of their own
+    extra = timing.reindex(frame['user_id']).fillna({'correlated_wallets': 0, 'max_timing_jaccard': 0.0,
+                                                     'timing_group_size': 1})
+    extra = extra.astype({'correlated_wallets': 'int64', 'timing_group_size': 'int64'})
+    return frame.assign(**{column: extra[column].to_numpy() for column in extra.columns})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute per-user Sybil features from the local store")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="recompute every user's features from scratch in this many processes")
+    parser.add_argument('--shards', type=int, default=None, help="user shards for --workers (default: one per worker)")
+    parser.add_argument('--timing', action='store_true',
+                        help="add cross-wallet timing-correlation columns and export the pair graph")
+    parser.add_argument('--bucket', type=int, default=cooccurrence.BUCKET_SECONDS, help="timing bucket width in seconds")
+    args = parser.parse_args()
+
+    # Configure logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    logging.info("Syncing the local store.")
+    store.sync()
+
+    if args.workers:
+        # Split users by address hash and extract each shard in its own process
+        logging.info(f"Extracting features in {args.workers} processes.")
+        X = shards.extract_features_parallel(n_shards=args.shards, workers=args.workers)
+        n_users, frames = len(X), [X]
     else:
-        avg_time_interval.append(None)
-    
-    # Feature 4: Burst count (multiple chests in <1 minute)
-    bursts = sum(1 for i in range(len(intervals)) if intervals[i] < 60) if len(intervals) > 1 else 0
-    burst_count.append(bursts)
-    
-    # Feature 5: Daily activity pattern entropy
-    day_counts = pd.Series([datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d') for ts in timestamps]).value_counts()
-    daily_entropy.append(entropy(day_counts))  # Compute entropy of daily activity
-    
-    # Append user ID
-    user_ids.append(user_id)
-
-# Build DataFrame
-logging.info("Building DataFrame.")
-X = pd.DataFrame({
-    "user_id": user_ids,
-    "total_chests": total_chests,
-    "premium_chests": premium_chests,
-    "avg_time_interval": avg_time_interval,
-    "burst_count": burst_count,
-    "daily_entropy": daily_entropy  # Entropy of daily activity
-})
-
-# Save DataFrame to CSV
-output_file_path = 'user_data_features.csv'
-X.to_csv(output_file_path, index=False)
-logging.info(f"DataFrame saved to {output_file_path}")
+        # Bring the per-user feature state up to date; only events newer than
+        # the last run are read
+        logging.info("Updating features from new chest opens.")
+        feature_store.update()
+        n_users, frames = feature_store.count_users(), feature_store.iter_features()
+
+    columns = FEATURE_COLUMNS
+    if args.timing:
+        # Wallets that keep opening chests in the same seconds as each other
+        logging.info(f"Correlating wallets in {args.bucket}s buckets.")
+        pairs = cooccurrence.correlated_pairs(store.load_events(), args.bucket)
+        groups = cooccurrence.timing_groups(pairs)
+        pairs.to_csv('timing_edges.csv', index=False)
+        groups.to_csv('timing_groups.csv', index=False)
+        logging.info(f"Saved {len(pairs)} correlated pairs in {groups['group'].nunique()} groups to timing_edges.csv")
+        timing = cooccurrence.timing_features(pairs, groups['user_id']).set_index('user_id')
+        columns = FEATURE_COLUMNS + cooccurrence.TIMING_COLUMNS
+        frames = (with_timing(frame, timing) for frame in frames)
+
+    # Stream the features of every user into a memory-mapped matrix for
+    # db_scan.py and a CSV for the Streamlit app, one chunk of users at a time
+    feature_matrix.write_matrix(features_to_csv(frames), matrix_path, n_users, columns)
+    logging.info(f"Saved features for {n_users} users to {matrix_path} and {output_file_path}")
+
+    # Now the matrix can be used for further processing with DBSCAN or other models
+
 
-# Now X can be used for further processing with DBSCAN or other models
+if __name__ == '__main__':
+    main()